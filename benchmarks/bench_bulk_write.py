@@ -0,0 +1,66 @@
+import os
+import sys
+import time
+import logging
+import argparse
+from sqlalchemy import create_engine, text
+
+sys.path.append(os.path.join(os.path.dirname(__file__), "..", "scripts"))
+
+from bulk import copy_dataframe # noqa: E402
+from synthetic import generate_deliveries # noqa: E402
+
+logging.basicConfig(level=logging.WARNING, format="%(asctime)s - %(levelname)s - %(message)s")
+
+BENCH_SCHEMA = "raw_data"
+BENCH_TABLE = "bench_bulk_write"
+
+
+def time_to_sql(df, engine):
+    start = time.perf_counter()
+    df.to_sql(name=BENCH_TABLE, con=engine, schema=BENCH_SCHEMA, if_exists="append", index=False)
+    return time.perf_counter() - start
+
+
+def time_copy(df, engine, batch_size):
+    start = time.perf_counter()
+    copy_dataframe(df, engine, BENCH_TABLE, BENCH_SCHEMA, batch_size=batch_size)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare DataFrame.to_sql with the COPY bulk writer")
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--batch-size", type=int, default=50_000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    engine = create_engine(os.environ["AIRFLOW__DATABASE__SQL_ALCHEMY_CONN"])
+    df = generate_deliveries(args.rows)
+
+    with engine.begin() as conn:
+        conn.execute(text(f"CREATE SCHEMA IF NOT EXISTS {BENCH_SCHEMA}"))
+    df.head(0).to_sql(name=BENCH_TABLE, con=engine, schema=BENCH_SCHEMA, if_exists="replace", index=False)
+
+    results = {"to_sql": [], "copy": []}
+    try:
+        for _ in range(args.repeat):
+            for name, run in [("to_sql", lambda: time_to_sql(df, engine)),
+                              ("copy", lambda: time_copy(df, engine, args.batch_size))]:
+                with engine.begin() as conn:
+                    conn.execute(text(f"TRUNCATE {BENCH_SCHEMA}.{BENCH_TABLE}"))
+                results[name].append(run())
+    finally:
+        with engine.begin() as conn:
+            conn.execute(text(f"DROP TABLE IF EXISTS {BENCH_SCHEMA}.{BENCH_TABLE}"))
+        engine.dispose()
+
+    print(f"rows={args.rows} batch_size={args.batch_size} repeat={args.repeat}")
+    for name, timings in results.items():
+        best = min(timings)
+        print(f"{name:>8}: best {best:.3f}s  ({args.rows / best:,.0f} rows/s)")
+    print(f" speedup: {min(results['to_sql']) / min(results['copy']):.1f}x")
+
+
+if __name__ == "__main__":
+    main()
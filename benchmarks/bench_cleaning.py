@@ -0,0 +1,117 @@
+import os
+import sys
+import time
+import logging
+import argparse
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.path.join(os.path.dirname(__file__), "..", "scripts"))
+
+from transform import cleaning # noqa: E402
+from synthetic import generate_deliveries # noqa: E402
+
+
+# the multi-pass implementation cleaning() replaced, kept for comparison
+def legacy_cleaning(df):
+    logging.info("Starting data cleaning process...")
+    
+    df["Order_Date"] = pd.to_datetime(df["Order_Date"], format="mixed", errors="coerce", dayfirst=True)
+    df["Time_Orderd"] = pd.to_datetime(df["Time_Orderd"], format="%H:%M", errors="coerce").dt.time
+    df["Time_Order_picked"] = pd.to_datetime(df["Time_Order_picked"], format="%H:%M", errors="coerce").dt.time
+    
+    df["Delivery_person_Age"] = pd.to_numeric(df["Delivery_person_Age"], errors='coerce').fillna(0).astype(int)
+    df["Delivery_person_Ratings"] = pd.to_numeric(df["Delivery_person_Ratings"], errors='coerce').fillna(0).astype(float)
+    df["Restaurant_latitude"] = pd.to_numeric(df["Restaurant_latitude"], errors='coerce')
+    df["Restaurant_longitude"] = pd.to_numeric(df["Restaurant_longitude"], errors='coerce')
+    df["Delivery_location_latitude"] = pd.to_numeric(df["Delivery_location_latitude"], errors='coerce')
+    df["Delivery_location_longitude"] = pd.to_numeric(df["Delivery_location_longitude"], errors='coerce')
+    df["Time_taken (min)"] = pd.to_numeric(df["Time_taken (min)"], errors='coerce')
+    
+    df["multiple_deliveries"] = pd.to_numeric(df["multiple_deliveries"], errors='coerce').fillna(0).astype(int)
+    
+    df["Weather_conditions"] = df["Weather_conditions"].str.strip().str.title()
+    df["Road_traffic_density"] = df["Road_traffic_density"].str.strip().str.title()
+    df["Vehicle_condition"] = pd.to_numeric(df["Vehicle_condition"], errors='coerce').fillna(0).astype(int)
+    df["Type_of_order"] = df["Type_of_order"].str.strip().str.title()
+    df["Type_of_vehicle"] = df["Type_of_vehicle"].str.strip().str.lower().str.replace(" ", "_")
+    df["Festival"] = df["Festival"].str.strip().str.title()
+    df["City"] = df["City"].str.strip().str.title()
+    
+    critical_fields = ["ID", "Delivery_person_ID", "Restaurant_latitude", "Restaurant_longitude", 
+                      "Delivery_location_latitude", "Delivery_location_longitude", "Order_Date",
+                      "Time_Orderd", "Time_Order_picked", "Type_of_order", "City", "Time_taken (min)"]
+
+    initial_rows_count = len(df)
+    df = df.replace(["", " ", "N/A", "n/a", "nan", "None", "none", None, np.nan], pd.NA)
+    df = df.dropna(subset=critical_fields)
+    dropped_rows_count = initial_rows_count - len(df)
+    logging.info(f"{dropped_rows_count} rows with critical missing fields dropped!")
+    
+    initial_rows_count = len(df)
+    df = df.drop_duplicates(keep='first')
+    duplicate_count = initial_rows_count - len(df)
+    logging.info(f"{duplicate_count} duplicate rows dropped!")
+    
+    # Coordinate validation
+    initial_rows_count = len(df)
+    df = df[
+        (df['Restaurant_latitude'].between(-90, 90)) & 
+        (df['Restaurant_longitude'].between(-180, 180)) &
+        (df['Delivery_location_latitude'].between(-90, 90)) & 
+        (df['Delivery_location_longitude'].between(-180, 180)) &
+        (df['Restaurant_latitude'] != 0) & 
+        (df['Restaurant_longitude'] != 0) &
+        (df['Delivery_location_latitude'] != 0) & 
+        (df['Delivery_location_longitude'] != 0)
+    ]
+    invalid_coords_count = initial_rows_count - len(df)
+    logging.info(f"{invalid_coords_count} rows with invalid coordinates dropped!")
+    
+    logging.info(f"Data cleaning completed. Final record count: {len(df)}")
+    return df
+    
+
+def assert_same_output(expected, actual):
+    # the old replace() left NaN-bearing float columns as object dtype, so
+    # values are compared rather than dtypes
+    assert list(expected.index) == list(actual.index), "surviving rows differ"
+    for column in expected.columns:
+        left = expected[column].astype(object).where(expected[column].notna(), None)
+        right = actual[column].astype(object).where(actual[column].notna(), None)
+        assert left.tolist() == right.tolist(), f"values differ in {column}"
+
+
+def best_of(func, raw, repeat):
+    timings = []
+    for _ in range(repeat):
+        df = raw.copy()
+        start = time.perf_counter()
+        result = func(df)
+        timings.append(time.perf_counter() - start)
+    return min(timings), result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare transform.cleaning with the multi-pass implementation")
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--dirty-rate", type=float, default=0.03)
+    parser.add_argument("--duplicate-rate", type=float, default=0.01)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    logging.disable(logging.INFO)
+    raw = generate_deliveries(args.rows, dirty_rate=args.dirty_rate, duplicate_rate=args.duplicate_rate)
+
+    before, expected = best_of(legacy_cleaning, raw, args.repeat)
+    after, actual = best_of(cleaning, raw, args.repeat)
+    assert_same_output(expected, actual)
+
+    print(f"rows={len(raw)} kept={len(actual)}")
+    print(f"  before: {before:.2f}s ({len(raw) / before:,.0f} rows/s)")
+    print(f"   after: {after:.2f}s ({len(raw) / after:,.0f} rows/s)")
+    print(f" speedup: {before / after:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+import os
+import sys
+import time
+import logging
+import argparse
+import resource
+import tempfile
+import multiprocessing
+import pandas as pd
+
+sys.path.append(os.path.join(os.path.dirname(__file__), "..", "scripts"))
+
+import extract # noqa: E402
+from transform import cleaning # noqa: E402
+from synthetic import write_deliveries_csv # noqa: E402
+
+READERS = {
+    "pandas": lambda path: pd.read_csv(path),
+    "arrow": lambda path: extract.read_deliveries_csv(path)
+}
+
+
+def measure(reader, path, pipe):
+    # runs in a fresh child so the peak RSS belongs to this reader alone
+    logging.getLogger().setLevel(logging.WARNING)
+    rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    start = time.perf_counter()
+    df = READERS[reader](path)
+    parse_seconds = time.perf_counter() - start
+    rss_after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    frame_bytes = df.memory_usage(deep=True).sum()
+
+    start = time.perf_counter()
+    cleaned = cleaning(df)
+    pipe.send({
+        "parse_seconds": parse_seconds,
+        "clean_seconds": time.perf_counter() - start,
+        "peak_rss_mib": (rss_after - rss_before) / 1024,
+        "frame_mib": frame_bytes / 2 ** 20,
+        "typed": bool(df.attrs.get("typed_csv")),
+        "cleaned_rows": len(cleaned)
+    })
+
+
+def run(reader, path):
+    parent, child = multiprocessing.Pipe()
+    process = multiprocessing.get_context("fork").Process(target=measure, args=(reader, path, child))
+    process.start()
+    result = parent.recv()
+    process.join()
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare pd.read_csv with the typed Arrow CSV reader")
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--csv", help="existing Deliveries-shaped file instead of a generated one")
+    parser.add_argument("--dirty-rate", type=float, default=0.03)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    path = args.csv
+    if path is None:
+        path = os.path.join(tempfile.mkdtemp(prefix="csv_bench_"), "deliveries.csv")
+        write_deliveries_csv(path, args.rows, dirty_rate=args.dirty_rate)
+    print(f"file={path} size={os.path.getsize(path) / 2 ** 20:.0f} MiB cpus={os.cpu_count()}")
+
+    best = {}
+    for reader in READERS:
+        runs = [run(reader, path) for _ in range(args.repeat)]
+        best[reader] = min(runs, key=lambda result: result["parse_seconds"])
+        result = best[reader]
+        print(f"{reader:>7}: parse {result['parse_seconds']:.2f}s, clean {result['clean_seconds']:.2f}s, "
+              f"peak RSS +{result['peak_rss_mib']:.0f} MiB, frame {result['frame_mib']:.0f} MiB, "
+              f"typed={result['typed']}, cleaned rows {result['cleaned_rows']}")
+
+    pandas_result, arrow_result = best["pandas"], best["arrow"]
+    pandas_total = pandas_result["parse_seconds"] + pandas_result["clean_seconds"]
+    arrow_total = arrow_result["parse_seconds"] + arrow_result["clean_seconds"]
+    print(f"parse speedup {pandas_result['parse_seconds'] / arrow_result['parse_seconds']:.1f}x, "
+          f"parse+clean speedup {pandas_total / arrow_total:.1f}x, "
+          f"frame memory {pandas_result['frame_mib'] / arrow_result['frame_mib']:.1f}x smaller")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+import os
+import sys
+import time
+import logging
+import argparse
+import numpy as np
+import pandas as pd
+from sqlalchemy import create_engine, text
+
+sys.path.append(os.path.join(os.path.dirname(__file__), "..", "scripts"))
+
+from transform import cleaning, create_star_schema, create_star_schema_tables # noqa: E402
+from load import build_dim_location, build_dim_datetime, populate_dim_location, populate_dim_datetime # noqa: E402
+from geo import geo_cells # noqa: E402
+from synthetic import generate_deliveries # noqa: E402
+
+
+# the iterrows() builders these functions replaced, kept for comparison and
+# brought up to the same output: geohash cells and normalized order dates
+def legacy_build_dim_location(df):
+    locations = []
+    for _, row in df.iterrows():
+        cells, latitudes, longitudes = geo_cells(
+            np.array([row['Restaurant_latitude'], row['Delivery_location_latitude']], dtype=float),
+            np.array([row['Restaurant_longitude'], row['Delivery_location_longitude']], dtype=float))
+        locations.append({
+            "geo_cell": cells[0],
+            "latitude": latitudes[0],
+            "longitude": longitudes[0],
+            "city": row['City'],
+            "location_type": "restaurant"
+        })
+        locations.append({
+            'geo_cell': cells[1],
+            'latitude': latitudes[1],
+            'longitude': longitudes[1],
+            'city': row['City'],
+            'location_type': 'delivery'
+        })
+    return pd.DataFrame(locations).drop_duplicates(subset=['geo_cell', 'city', 'location_type'])
+
+
+def legacy_build_dim_datetime(df):
+    datetimes = df[['Order_Date', 'Time_Orderd', 'Time_Order_picked']].drop_duplicates()
+    datetime_records = []
+    for _, row in datetimes.iterrows():
+        datetime_records.append({
+            'order_date': row['Order_Date'].normalize(),
+            'time_ordered': row['Time_Orderd'],
+            'time_picked': row['Time_Order_picked'],
+            'day': row['Order_Date'].day,
+            'month': row['Order_Date'].month,
+            'year': row['Order_Date'].year
+        })
+    return pd.DataFrame(datetime_records)
+
+
+def assert_same_rows(expected, actual, name):
+    # same columns and the same rows in any order; values are compared rather than dtypes
+    assert list(expected.columns) == list(actual.columns), f"{name}: columns differ"
+    key = [column for column in expected.columns if column not in ('latitude', 'longitude')]
+    expected = expected.astype(object).sort_values(key, key=lambda values: values.astype(str)).reset_index(drop=True)
+    actual = actual.astype(object).sort_values(key, key=lambda values: values.astype(str)).reset_index(drop=True)
+    assert len(expected) == len(actual), f"{name}: {len(expected)} rows expected, {len(actual)} built"
+    for column in expected.columns:
+        left = expected[column].where(expected[column].notna(), None)
+        right = actual[column].where(actual[column].notna(), None)
+        assert left.tolist() == right.tolist(), f"{name}: values differ in {column}"
+
+
+def timed(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return time.perf_counter() - start, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the dim_location and dim_datetime builders")
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--skip-legacy", action="store_true", help="only time the vectorized builders")
+    parser.add_argument("--write", action="store_true",
+                        help="also time the upserts; TRUNCATES the star_schema dimensions behind "
+                             "AIRFLOW__DATABASE__SQL_ALCHEMY_CONN, never point it at a live warehouse")
+    args = parser.parse_args()
+
+    logging.getLogger().setLevel(logging.WARNING)
+    df = cleaning(generate_deliveries(args.rows))
+    print(f"source rows={args.rows} cleaned rows={len(df)}")
+
+    for name, vectorized, legacy in [("dim_location", build_dim_location, legacy_build_dim_location),
+                                     ("dim_datetime", build_dim_datetime, legacy_build_dim_datetime)]:
+        seconds, built = timed(vectorized, df)
+        line = f"{name:>12}: vectorized {seconds:.2f}s ({len(built)} rows)"
+        if not args.skip_legacy:
+            legacy_seconds, expected = timed(legacy, df)
+            assert_same_rows(expected, built, name)
+            line += f", iterrows {legacy_seconds:.2f}s, speedup {legacy_seconds / seconds:.1f}x"
+        print(line)
+
+    if args.write:
+        engine = create_engine(os.environ["AIRFLOW__DATABASE__SQL_ALCHEMY_CONN"])
+        create_star_schema(engine)
+        create_star_schema_tables(engine)
+        with engine.begin() as conn:
+            conn.execute(text("TRUNCATE star_schema.dim_location, star_schema.dim_datetime RESTART IDENTITY CASCADE"))
+        for name, populate in [("dim_location", populate_dim_location), ("dim_datetime", populate_dim_datetime)]:
+            seconds, written = timed(populate, df, engine)
+            print(f"{name:>12}: upsert {seconds:.2f}s ({written} rows written)")
+        engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,198 @@
+import os
+import sys
+import json
+import time
+import logging
+import argparse
+import platform
+import tempfile
+import subprocess
+from datetime import datetime, timezone
+import pandas as pd
+from sqlalchemy import create_engine, event
+
+sys.path.append(os.path.join(os.path.dirname(__file__), "..", "scripts"))
+
+from extract import RAW_SCHEMA, db_schema, load_csv_to_db, extract_raw_from_db # noqa: E402
+from transform import cleaning, create_star_schema, create_star_schema_tables # noqa: E402
+from load import (populate_dim_delivery_person, populate_dim_location, populate_dim_datetime, # noqa: E402
+                  populate_dim_vehicle, populate_fact_deliveries)
+from ETL import clear_all_tables # noqa: E402
+from synthetic import write_deliveries_csv # noqa: E402
+
+DEFAULT_OUTPUT = os.path.join(os.path.dirname(__file__), "results", "etl_stages.json")
+
+# dialects with star schema DDL; on any other only the raw stages are timed
+STAR_DIALECTS = ("postgresql", "duckdb")
+SMOKE_ROWS = 1000
+
+STAR_STAGES = [
+    ("populate_dim_delivery_person", populate_dim_delivery_person),
+    ("populate_dim_location", populate_dim_location),
+    ("populate_dim_datetime", populate_dim_datetime),
+    ("populate_dim_vehicle", populate_dim_vehicle),
+    ("populate_fact_deliveries", populate_fact_deliveries)
+]
+
+
+def timed(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return time.perf_counter() - start, result
+
+
+def stage_result(seconds, rows):
+    return {"seconds": round(seconds, 4), "rows": rows, "rows_per_s": round(rows / seconds) if seconds else None}
+
+
+def connect(url, workdir):
+    engine = create_engine(url)
+    if engine.dialect.name == "sqlite":
+        # SQLite has no schemas; the raw schema is an attached database file
+        raw_path = os.path.join(workdir, f"{RAW_SCHEMA}.sqlite")
+
+        @event.listens_for(engine, "connect")
+        def attach_raw_schema(dbapi_conn, _):
+            dbapi_conn.execute(f"ATTACH DATABASE '{raw_path}' AS {RAW_SCHEMA}")
+    else:
+        db_schema(engine)
+    return engine
+
+
+def run_size(rows, engine, workdir, args):
+    csv_path = os.path.join(workdir, f"deliveries_{rows}.csv")
+    if not os.path.exists(csv_path):
+        write_deliveries_csv(csv_path, rows, seed=args.seed, dirty_rate=args.dirty_rate,
+                             duplicate_rate=args.duplicate_rate)
+
+    stages = {}
+    seconds, _ = timed(load_csv_to_db, engine, csv_path)
+    seconds_raw, raw = timed(extract_raw_from_db, engine)
+    stages["load_csv_to_db"] = stage_result(seconds, len(raw))
+    stages["extract_raw_from_db"] = stage_result(seconds_raw, len(raw))
+
+    seconds, df = timed(cleaning, raw)
+    stages["cleaning"] = stage_result(seconds, len(raw))
+    del raw
+
+    if engine.dialect.name in STAR_DIALECTS:
+        create_star_schema(engine)
+        create_star_schema_tables(engine)
+        clear_all_tables(engine)
+        for name, populate in STAR_STAGES:
+            seconds, written = timed(populate, df, engine)
+            stages[name] = stage_result(seconds, written)
+    else:
+        logging.warning(f"{engine.dialect.name} has no star schema DDL, only the raw stages are timed")
+
+    return {"rows": rows, "cleaned_rows": len(df), "stages": stages}
+
+
+def git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), check=True).stdout.strip()
+    except Exception:
+        return None
+
+
+def compare(results, baseline, tolerance):
+    # a stage regresses when it is slower than the baseline by more than tolerance
+    previous = {(run["rows"], name): stage["seconds"]
+                for run in baseline["runs"] for name, stage in run["stages"].items()}
+    regressions = []
+    for run in results["runs"]:
+        for name, stage in run["stages"].items():
+            before = previous.get((run["rows"], name))
+            if not before:
+                continue
+            ratio = stage["seconds"] / before
+            stage["baseline_seconds"] = before
+            stage["ratio"] = round(ratio, 3)
+            flag = ""
+            if ratio > 1 + tolerance:
+                regressions.append(f"{name}@{run['rows']}")
+                flag = "  REGRESSION"
+            print(f"{run['rows']:>10} {name:>30}: {before:.3f}s -> {stage['seconds']:.3f}s ({ratio:.2f}x){flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time every ETL stage on synthetic Deliveries data")
+    parser.add_argument("--rows", type=int, nargs="+", default=[100_000],
+                        help="dataset sizes, e.g. --rows 100000 1000000 10000000")
+    parser.add_argument("--url",
+                        help="PostgreSQL, DuckDB or SQLite URL, AIRFLOW__DATABASE__SQL_ALCHEMY_CONN by default; "
+                             "the star_schema tables are TRUNCATED, never point it at a live warehouse")
+    parser.add_argument("--workdir", default=None, help="where the generated CSVs are kept between runs")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--dirty-rate", type=float, default=0.03)
+    parser.add_argument("--duplicate-rate", type=float, default=0.01)
+    parser.add_argument("--output", default=DEFAULT_OUTPUT)
+    parser.add_argument("--baseline", help="results file of a previous version to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed slowdown before a stage fails")
+    parser.add_argument("--smoke", action="store_true",
+                        help=f"run every stage once on {SMOKE_ROWS} rows, in a throwaway DuckDB file "
+                             "unless --url is given, and fail if any stage is skipped or empty")
+    args = parser.parse_args()
+
+    workdir = args.workdir or tempfile.mkdtemp(prefix="etl_bench_")
+    os.makedirs(workdir, exist_ok=True)
+    if args.smoke:
+        # a quick end-to-end check, its timings are not kept
+        args.rows = [SMOKE_ROWS]
+        args.url = args.url or f"duckdb:///{os.path.join(workdir, 'smoke.duckdb')}"
+        args.output = os.path.join(workdir, "smoke.json")
+    args.url = args.url or os.getenv("AIRFLOW__DATABASE__SQL_ALCHEMY_CONN")
+    if not args.url:
+        parser.error("--url or AIRFLOW__DATABASE__SQL_ALCHEMY_CONN is required")
+    logging.getLogger().setLevel(logging.WARNING)
+
+    engine = connect(args.url, workdir)
+    results = {
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "revision": git_revision(),
+        "python": platform.python_version(),
+        "pandas": pd.__version__,
+        "database": engine.dialect.name,
+        "dirty_rate": args.dirty_rate,
+        "duplicate_rate": args.duplicate_rate,
+        "runs": []
+    }
+    try:
+        for rows in args.rows:
+            run = run_size(rows, engine, workdir, args)
+            results["runs"].append(run)
+            for name, stage in run["stages"].items():
+                print(f"{rows:>10} {name:>30}: {stage['seconds']:.3f}s ({stage['rows']} rows)")
+    finally:
+        engine.dispose()
+
+    regressions = []
+    if args.baseline:
+        with open(args.baseline) as baseline:
+            regressions = compare(results, json.load(baseline), args.tolerance)
+
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    with open(args.output, "w") as output:
+        json.dump(results, output, indent=2)
+    print(f"results written to {args.output}")
+
+    if regressions:
+        print(f"regressed stages: {', '.join(regressions)}")
+        sys.exit(1)
+
+    if args.smoke:
+        expected = ["load_csv_to_db", "extract_raw_from_db", "cleaning"]
+        if results["database"] in STAR_DIALECTS:
+            expected += [name for name, _ in STAR_STAGES]
+        stages = results["runs"][0]["stages"]
+        failed = [name for name in expected if not stages.get(name, {}).get("rows")]
+        if failed:
+            print(f"smoke run failed, stages skipped or empty: {', '.join(failed)}")
+            sys.exit(1)
+        print(f"smoke run passed: {len(expected)} stages on {results['database']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+import os
+import sys
+import time
+import logging
+import argparse
+import numpy as np
+import pandas as pd
+
+# the lookup path is timed as it runs in serial key mode
+os.environ["ETL_KEY_MODE"] = "serial"
+sys.path.append(os.path.join(os.path.dirname(__file__), "..", "scripts"))
+
+from transform import cleaning # noqa: E402
+from load import (build_dim_location, build_dim_datetime, resolve_surrogate_keys, # noqa: E402
+                  hash_surrogate_keys, DIMENSION_KEY_COLUMNS)
+from keys import assign_hash_keys # noqa: E402
+from synthetic import generate_deliveries # noqa: E402
+
+FACT_KEY_COLUMNS = ['delivery_person_key', 'restaurant_location_key', 'delivery_location_key',
+                    'vehicle_key', 'datetime_key']
+
+
+def serial_dimension_keys(df):
+    # what fetch_dimension_keys reads back after the dimensions are written,
+    # built in memory so only the lookup itself is timed
+    dimensions = {
+        'delivery_person': df[['Delivery_person_ID']].drop_duplicates().rename(
+            columns={'Delivery_person_ID': 'delivery_person_id'}),
+        'location': build_dim_location(df)[['geo_cell', 'city', 'location_type']],
+        'vehicle': df[['Vehicle_condition', 'Type_of_vehicle']].drop_duplicates().rename(
+            columns={'Vehicle_condition': 'vehicle_condition', 'Type_of_vehicle': 'vehicle_type'}),
+        'datetime': build_dim_datetime(df)[['order_date', 'time_ordered', 'time_picked']]
+    }
+    return {name: frame.reset_index(drop=True).assign(**{DIMENSION_KEY_COLUMNS[name]: np.arange(1, len(frame) + 1)})
+            for name, frame in dimensions.items()}
+
+
+def timed(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return time.perf_counter() - start, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark surrogate key lookups against hash keys")
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    logging.getLogger().setLevel(logging.ERROR)
+    df = cleaning(generate_deliveries(args.rows))
+    print(f"source rows={args.rows} cleaned rows={len(df)}")
+
+    dimension_keys = serial_dimension_keys(df)
+    lookup_seconds, (lookup_facts, _) = timed(resolve_surrogate_keys, df, None, dimension_keys)
+    hash_seconds, (hash_facts, _) = timed(hash_surrogate_keys, df)
+    print(f"   fact keys: lookup {lookup_seconds:.2f}s (plus reading every dimension back), "
+          f"hash {hash_seconds:.2f}s, speedup {lookup_seconds / hash_seconds:.1f}x")
+
+    # both keyings must group the facts the same way: one hash per looked-up key and back
+    for key_column in FACT_KEY_COLUMNS:
+        pairs = pd.DataFrame({"lookup": lookup_facts[key_column], "hash": hash_facts[key_column]})
+        distinct = pairs.drop_duplicates()
+        if distinct["lookup"].duplicated().any() or distinct["hash"].duplicated().any():
+            raise AssertionError(f"{key_column}: hash keys do not match the looked-up keys one to one")
+
+    for table, frame in [('dim_location', build_dim_location(df)), ('dim_datetime', build_dim_datetime(df))]:
+        seconds, keyed = timed(assign_hash_keys, frame, table)
+        print(f"{table:>12}: hash keys and collision check {seconds:.2f}s ({len(keyed)} rows)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+import numpy as np
+import pandas as pd
+
+WEATHER_CONDITIONS = ["Sunny", "Stormy", "Sandstorms", "Cloudy", "Fog", "Windy"]
+TRAFFIC_DENSITIES = ["Low ", "Medium ", "High ", "Jam "]
+ORDER_TYPES = ["Snack ", "Meal ", "Drinks ", "Buffet "]
+VEHICLE_TYPES = ["motorcycle ", "scooter ", "electric_scooter ", "bicycle "]
+CITIES = ["Metropolitian ", "Urban ", "Semi-Urban "]
+CITY_WEIGHTS = [0.75, 0.22, 0.03]
+
+
+# columns that arrive as "NaN " in the Kaggle export
+DIRTY_COLUMNS = ["Delivery_person_Age", "Delivery_person_Ratings", "Time_Orderd", "Weather_conditions",
+                 "Road_traffic_density", "multiple_deliveries", "Festival", "City"]
+
+
+def generate_deliveries(rows, seed=0, restaurants=1500, delivery_people=1320,
+                        start_date="2022-02-11", days=55, vehicle_conditions=3, dirty_rate=0.0,
+                        duplicate_rate=0.0, batch=0, id_offset=0):
+    # raw, string-heavy frame shaped like data/source/Deliveries.csv; restaurants
+    # and people depend on seed only, so every batch of one dataset shares them
+    rng = np.random.default_rng(seed)
+
+    restaurant_coords = np.column_stack([
+        rng.uniform(9, 31, restaurants),
+        rng.uniform(72, 89, restaurants)
+    ]).round(6)
+    restaurant_cities = rng.choice(CITIES, restaurants, p=CITY_WEIGHTS)
+
+    rng = np.random.default_rng([seed, batch])
+    restaurant_idx = rng.integers(0, restaurants, rows)
+    restaurant_lat = restaurant_coords[restaurant_idx, 0]
+    restaurant_long = restaurant_coords[restaurant_idx, 1]
+
+    # three riders per restaurant code, 20 restaurant codes per city code
+    people = np.array([f"CITY{i // 60 % 22}RES{i // 3 % 20:02d}DEL{i % 3 + 1:02d}"
+                       for i in range(delivery_people)])
+    dates = pd.date_range(start_date, periods=days).strftime("%d-%m-%Y").to_numpy()
+
+    minute_ordered = rng.integers(0, 24 * 60, rows)
+    minute_picked = (minute_ordered + rng.choice([5, 10, 15], rows)) % (24 * 60)
+
+    df = pd.DataFrame({
+        "ID": pd.Series(np.arange(id_offset, id_offset + rows)).map("0x{:05x}".format),
+        "Delivery_person_ID": rng.choice(people, rows),
+        "Delivery_person_Age": rng.integers(20, 40, rows).astype(str),
+        "Delivery_person_Ratings": rng.uniform(3.5, 5, rows).round(1).astype(str),
+        "Restaurant_latitude": restaurant_lat,
+        "Restaurant_longitude": restaurant_long,
+        "Delivery_location_latitude": (restaurant_lat + rng.uniform(-0.1, 0.1, rows)).round(6),
+        "Delivery_location_longitude": (restaurant_long + rng.uniform(-0.1, 0.1, rows)).round(6),
+        "Order_Date": rng.choice(dates, rows),
+        "Time_Orderd": _format_minutes(minute_ordered),
+        "Time_Order_picked": _format_minutes(minute_picked),
+        "Weather_conditions": rng.choice(WEATHER_CONDITIONS, rows),
+        "Road_traffic_density": rng.choice(TRAFFIC_DENSITIES, rows),
+        "Vehicle_condition": rng.integers(0, vehicle_conditions, rows),
+        "Type_of_order": rng.choice(ORDER_TYPES, rows),
+        "Type_of_vehicle": rng.choice(VEHICLE_TYPES, rows),
+        "multiple_deliveries": rng.choice(["0", "1", "2", "3"], rows),
+        "Festival": rng.choice(["No ", "Yes "], rows, p=[0.98, 0.02]),
+        "City": restaurant_cities[restaurant_idx],
+        "Time_taken (min)": rng.integers(10, 55, rows)
+    })
+
+    # a single rate applies to every dirty column, a dict sets them one by one
+    rates = dirty_rate if isinstance(dirty_rate, dict) else dict.fromkeys(DIRTY_COLUMNS, dirty_rate)
+    for column, rate in rates.items():
+        if rate:
+            df[column] = df[column].astype(object).mask(rng.random(rows) < rate, "NaN ")
+    if not isinstance(dirty_rate, dict) and dirty_rate:
+        df["Restaurant_latitude"] = df["Restaurant_latitude"].mask(rng.random(rows) < dirty_rate / 2, 0.0)
+
+    if duplicate_rate:
+        duplicates = df.sample(frac=duplicate_rate, random_state=seed)
+        df = pd.concat([df, duplicates], ignore_index=True)
+
+    return df
+
+
+def _format_minutes(minutes):
+    hours = pd.Series(minutes // 60).map("{:02d}".format)
+    mins = pd.Series(minutes % 60).map("{:02d}".format)
+    return (hours + ":" + mins).to_numpy()
+
+
+def write_deliveries_csv(path, rows, batch_rows=1_000_000, seed=0, **options):
+    # generated and appended batch by batch so 10M-row files fit in memory
+    written = 0
+    batch = 0
+    while written < rows:
+        df = generate_deliveries(min(batch_rows, rows - written), seed=seed, batch=batch,
+                                 id_offset=written, **options)
+        df.to_csv(path, mode="w" if batch == 0 else "a", header=batch == 0, index=False)
+        written += min(batch_rows, rows - written)
+        batch += 1
+    return path
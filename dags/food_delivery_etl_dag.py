@@ -1,21 +1,39 @@
 from datetime import datetime, timedelta
 from airflow import DAG # type: ignore
-from airflow.operators.python import PythonOperator # type: ignore
+from airflow.operators.python import PythonOperator, ShortCircuitOperator # type: ignore
 from airflow.operators.email import EmailOperator # type: ignore
 from airflow.utils.dates import days_ago # type: ignore
 from airflow.operators.dummy import DummyOperator # type: ignore
+from airflow.exceptions import AirflowSkipException # type: ignore
 import sys
 import os
 import logging
+import pandas as pd
 
 sys.path.append('/opt/airflow/scripts')
 
 try:
-    from ETL import Extract, Transform, Load # type: ignore 
-    from extract import create_conn # type: ignore
+    from ETL import Extract, Backfill, clear_all_tables # type: ignore 
+    from load import (populate_dimensions, populate_fact_deliveries, # type: ignore
+                      refresh_delivery_aggregates)
+    from extract import (create_conn, RAW_ZONE, RAW_AUDIT, UNKNOWN_MONTH, DELIVERIES_SCHEMA, # type: ignore
+                         land_raw_zone, raw_zone_marker, iter_raw_zone, read_raw_zone, audit_raw_zone)
+    from incremental import (LOAD_MODE, source_changed, source_fingerprint, # type: ignore
+                             filter_new_deliveries, save_pipeline_state)
+    from cache import read_cached # type: ignore
+    from transform import (parallel_cleaning, create_star_schema, create_star_schema_tables, # type: ignore
+                           drop_fact_indexes, create_fact_indexes, ensure_fact_partitions)
+    from staging import stage_exists, save_stage, read_stage, iter_stage, clear_stages # type: ignore
+    from partitions import (PARTITION_CONCURRENCY, PARTITION_COLUMNS, partition_months, # type: ignore
+                            discover_partitions, select_partition)
+    from metrics import collect, reset, write_metrics # type: ignore
+    from warehouse import WAREHOUSE_TARGET, create_warehouse_conn, export_parquet # type: ignore
+    from backfill import parse_date_range # type: ignore
+    from quality import start_quarantine, join_quarantine # type: ignore
 except ImportError as e:
     logging.error(f"Failed to import ETL modules: {e}")
-    Extract = Transform = Load = create_conn = None
+    Extract = create_conn = collect = None
+    PARTITION_CONCURRENCY = WAREHOUSE_TARGET = None
 
 
 
@@ -32,57 +50,265 @@ dag = DAG(
     description='ETL pipeline for food delivery data - Portfolio Project',
     catchup=False,
     max_active_runs=1,
+    # trigger with both dates (YYYY-MM-DD, inclusive) to reprocess only that Order_Date range
+    params={"backfill_start": None, "backfill_end": None},
 )
 
+# extract stages the source split by order month, plan_partitions lists the
+# month (and city) partitions, transform_load_partition runs once per partition
+# as a mapped task and finalize_load builds what the partitions share.
+# Every task stages its output under the run id, so a retry resumes where it failed.
+# Raw data stays in Postgres (engine); the star schema goes to the ETL_WAREHOUSE
+# target (warehouse), which is the same engine unless it is DuckDB.
+# A run triggered with backfill_start/backfill_end replaces only that range's
+# facts in backfill_range and skips the full load.
+
+def publish_metrics(context, name):
+    # per-stage metrics of this task, to XCom and to the metrics directory;
+    # called from every finally, so skipped and failed tasks report too
+    if collect is None:
+        return
+    records = collect()
+    context['ti'].xcom_push(key='metrics', value=records)
+    write_metrics(name, records)
+
 def extract_task(**context):
     try:
         if Extract is None or create_conn is None:
             raise ImportError("ETL modules not available")
             
+        run_id = context['run_id']
+        reset()
+        if stage_exists(run_id, 'raw') or stage_exists(run_id, 'cleaned'):
+            logging.info("Source already staged for this run, skipping extraction")
+            return
+            
         logging.info("Starting data extraction...")
         engine = create_conn()
+        warehouse = create_warehouse_conn(engine)
+        
+        if LOAD_MODE == "incremental":
+            create_star_schema(warehouse)
+            create_star_schema_tables(warehouse)
+            if not source_changed(warehouse):
+                raise AirflowSkipException("Source file unchanged since last run")
+        
+        cleaned_df = read_cached(source_fingerprint())
+        if cleaned_df is not None:
+            # partitions load the cached cleaned frame and skip cleaning
+            save_stage(cleaned_df, run_id, 'cleaned', partition_by=partition_months)
+            logging.info("Cleaned data cached for this source, staged it by month")
+            return
+        
+        if RAW_ZONE:
+            # the landed Parquet is already split by month, audit_raw copies it to Postgres
+            land_raw_zone(source_fingerprint())
+            logging.info("Extraction completed (raw zone)")
+            return
+        
         raw_df = Extract(engine)
-        logging.info(f"Extraction completed: {len(raw_df)} records extracted")
+        save_stage(raw_df, run_id, 'raw', partition_by=partition_months)
+        logging.info("Extraction completed")
         
+    except AirflowSkipException:
+        raise
     except Exception as e:
         logging.error(f"Extraction failed: {e}")
         raise e
     finally:
+        if 'warehouse' in locals() and warehouse is not engine:
+            warehouse.dispose()
         if 'engine' in locals():
             engine.dispose()
+        publish_metrics(context, 'extract')
 
-def transform_task(**context):
+def backfill_range_task(**context):
+    # True lets the full load run, False skips it after the range was replaced
+    params = context['params']
+    if not params.get('backfill_start') and not params.get('backfill_end'):
+        return True
     try:
-        if Extract is None or Transform is None or create_conn is None:
+        reset()
+        start, end = parse_date_range(params['backfill_start'], params['backfill_end'])
+        engine = create_conn()
+        warehouse = create_warehouse_conn(engine)
+        facts_written = Backfill(engine, start, end, warehouse)
+        logging.info(f"Backfill {start.date()}..{end.date()} completed: {facts_written} facts written")
+        return False
+    except Exception as e:
+        logging.error(f"Backfill failed: {e}")
+        raise e
+    finally:
+        if 'warehouse' in locals() and warehouse is not engine:
+            warehouse.dispose()
+        if 'engine' in locals():
+            engine.dispose()
+        publish_metrics(context, 'backfill')
+
+def _source_stage(run_id):
+    # staged frame the partitions read, None when they read the raw zone
+    if stage_exists(run_id, 'cleaned'):
+        return 'cleaned'
+    if RAW_ZONE:
+        return None
+    return 'raw'
+
+def plan_partitions_task(**context):
+    try:
+        if create_conn is None:
             raise ImportError("ETL modules not available")
             
-        logging.info("Starting data transformation...")
+        run_id = context['run_id']
+        reset()
+        logging.info("Planning partitions...")
         engine = create_conn()
-        raw_df = Extract(engine)
-        cleaned_df = Transform(engine, raw_df)
-        logging.info(f"Transformation completed: {len(cleaned_df)} records transformed")
+        warehouse = create_warehouse_conn(engine)
+        stage = _source_stage(run_id)
+        if stage is None:
+            batches = iter_raw_zone(columns=PARTITION_COLUMNS)
+        else:
+            batches = iter_stage(run_id, stage, columns=PARTITION_COLUMNS)
+        partitions = discover_partitions(batches)
+        
+        # shared work happens once here, never in the mapped tasks: the
+        # warehouse is cleared for a full reload and every month's fact
+        # partition exists before the loads start writing into it
+        create_star_schema(warehouse)
+        create_star_schema_tables(warehouse)
+        if LOAD_MODE != "incremental":
+            clear_all_tables(warehouse)
+            drop_fact_indexes(warehouse)
+        months = sorted({partition['month'] for partition in partitions} - {UNKNOWN_MONTH})
+        ensure_fact_partitions(warehouse, [f"{month}-01" for month in months])
+        
+        # the partitions append their rejects to a table that already exists,
+        # cleared of what earlier runs quarantined from this source
+        fingerprint = source_fingerprint()
+        if stage != 'cleaned':
+            start_quarantine(engine, list(DELIVERIES_SCHEMA), fingerprint, run_id)
+        
+        context['ti'].xcom_push(key='source_fingerprint', value=fingerprint)
+        logging.info(f"{len(partitions)} partitions planned")
+        return partitions
         
     except Exception as e:
-        logging.error(f"Transformation failed: {e}")
+        logging.error(f"Partition planning failed: {e}")
         raise e
     finally:
+        if 'warehouse' in locals() and warehouse is not engine:
+            warehouse.dispose()
         if 'engine' in locals():
             engine.dispose()
+        publish_metrics(context, 'plan_partitions')
 
-def load_task(**context):
+def transform_load_partition_task(month, city=None, **context):
     try:
-        if Extract is None or Transform is None or Load is None or create_conn is None:
+        if create_conn is None:
             raise ImportError("ETL modules not available")
             
-        logging.info("Starting data loading...")
+        run_id = context['run_id']
+        reset()
+        logging.info(f"Transforming and loading partition month={month} city={city}...")
+        join_quarantine(context['ti'].xcom_pull(task_ids='plan_partitions', key='source_fingerprint'), run_id)
         engine = create_conn()
-        raw_df = Extract(engine)
-        cleaned_df = Transform(engine, raw_df)
-        Load(engine, cleaned_df)
-        logging.info(f"Loading completed: {len(cleaned_df)} records loaded")
+        warehouse = create_warehouse_conn(engine)
+        stage = _source_stage(run_id)
+        if stage == 'cleaned':
+            cleaned_df = select_partition(read_stage(run_id, 'cleaned', partitions=[month]), month, city)
+            raw_records = len(cleaned_df)
+        else:
+            if stage is None:
+                raw_df = read_raw_zone(months=[month])
+            else:
+                raw_df = read_stage(run_id, 'raw', partitions=[month])
+            raw_df = select_partition(raw_df, month, city)
+            raw_records = len(raw_df)
+            cleaned_df = parallel_cleaning(raw_df, engine=engine)
+        
+        if LOAD_MODE == "incremental":
+            cleaned_df = filter_new_deliveries(cleaned_df, warehouse)
+        
+        # dimension upserts are idempotent and take turns per table, so
+        # partitions sharing people, places or vehicles can load side by side;
+        # one transaction per partition takes the table locks in a fixed order,
+        # parallel builders would hold them across connections and deadlock
+        facts_loaded = 0
+        if len(cleaned_df):
+            populate_dimensions(cleaned_df, warehouse, workers=1)
+            facts_loaded = populate_fact_deliveries(cleaned_df, warehouse)
+        last_order_date = cleaned_df["Order_Date"].max() if len(cleaned_df) else None
+        logging.info(f"Partition month={month} city={city}: {raw_records} raw, "
+                     f"{len(cleaned_df)} cleaned, {facts_loaded} facts loaded")
+        return {
+            "month": month,
+            "city": city,
+            "raw_records": raw_records,
+            "cleaned_records": len(cleaned_df),
+            "facts_loaded": facts_loaded,
+            "last_order_date": None if pd.isna(last_order_date) else str(last_order_date.date())
+        }
         
     except Exception as e:
-        logging.error(f"Loading failed: {e}")
+        logging.error(f"Partition month={month} city={city} failed: {e}")
+        raise e
+    finally:
+        if 'warehouse' in locals() and warehouse is not engine:
+            warehouse.dispose()
+        if 'engine' in locals():
+            engine.dispose()
+        publish_metrics(context, f"partition_{month}_{city}")
+
+def finalize_load_task(**context):
+    try:
+        if create_conn is None:
+            raise ImportError("ETL modules not available")
+            
+        run_id = context['run_id']
+        reset()
+        logging.info("Finalizing load...")
+        engine = create_conn()
+        warehouse = create_warehouse_conn(engine)
+        ti = context['ti']
+        results = [result for result in ti.xcom_pull(task_ids='transform_load_partition') or [] if result]
+        
+        # indexes, aggregates and state are shared, so they are built once after every partition
+        if LOAD_MODE != "incremental":
+            create_fact_indexes(warehouse)
+        refresh_delivery_aggregates(warehouse)
+        
+        facts_loaded = sum(result["facts_loaded"] for result in results)
+        order_dates = [result["last_order_date"] for result in results if result["last_order_date"]]
+        save_pipeline_state(warehouse, ti.xcom_pull(task_ids='plan_partitions', key='source_fingerprint'),
+                            max(order_dates) if order_dates else None, facts_loaded)
+        export_parquet(warehouse)
+        
+        raw_records = sum(result["raw_records"] for result in results)
+        cleaned_records = sum(result["cleaned_records"] for result in results)
+        logging.info(f"Loading completed: {len(results)} partitions, {raw_records} raw records, "
+                     f"{cleaned_records} cleaned, {facts_loaded} facts loaded")
+        clear_stages(run_id)
+        
+    except Exception as e:
+        logging.error(f"Finalizing load failed: {e}")
+        raise e
+    finally:
+        if 'warehouse' in locals() and warehouse is not engine:
+            warehouse.dispose()
+        if 'engine' in locals():
+            engine.dispose()
+        publish_metrics(context, 'finalize_load')
+
+def audit_raw_task(**context):
+    # runs beside transform, so the raw table never delays the warehouse load
+    if not (RAW_ZONE and RAW_AUDIT):
+        raise AirflowSkipException("Raw zone audit copy disabled")
+    if raw_zone_marker() is None:
+        raise AirflowSkipException("Nothing landed in the raw zone")
+    try:
+        engine = create_conn()
+        audit_raw_zone(engine)
+    except Exception as e:
+        logging.error(f"Raw audit copy failed: {e}")
         raise e
     finally:
         if 'engine' in locals():
@@ -93,28 +319,53 @@ start_pipeline = DummyOperator(
     dag=dag,
 )
 
+# only the full load is skipped, end_pipeline still runs on none_failed
+backfill_range = ShortCircuitOperator(
+    task_id='backfill_range',
+    python_callable=backfill_range_task,
+    ignore_downstream_trigger_rules=False,
+    dag=dag,
+)
+
 extract = PythonOperator(
     task_id='extract_data',
     python_callable=extract_task,
     dag=dag,
 )
 
-transform = PythonOperator(
-    task_id='transform_data',
-    python_callable=transform_task,
+plan_partitions = PythonOperator(
+    task_id='plan_partitions',
+    python_callable=plan_partitions_task,
+    dag=dag,
+)
+
+# one mapped task per partition; throughput grows with executor slots up to the limit.
+# A DuckDB file takes one writing process at a time, so its partitions run in turn
+transform_load_partition = PythonOperator.partial(
+    task_id='transform_load_partition',
+    python_callable=transform_load_partition_task,
+    max_active_tis_per_dag=1 if WAREHOUSE_TARGET == "duckdb" else PARTITION_CONCURRENCY,
+    dag=dag,
+).expand(op_kwargs=plan_partitions.output)
+
+finalize_load = PythonOperator(
+    task_id='finalize_load',
+    python_callable=finalize_load_task,
     dag=dag,
 )
 
-load = PythonOperator(
-    task_id='load_data',
-    python_callable=load_task,
+audit_raw = PythonOperator(
+    task_id='audit_raw_data',
+    python_callable=audit_raw_task,
     dag=dag,
 )
 
 end_pipeline = DummyOperator(
     task_id='end_pipeline',
+    trigger_rule='none_failed',
     dag=dag,
 )
 
 
-start_pipeline >> extract >> transform >> load >> end_pipeline
\ No newline at end of file
+start_pipeline >> backfill_range >> extract >> plan_partitions >> transform_load_partition >> finalize_load >> end_pipeline
+extract >> audit_raw >> end_pipeline
\ No newline at end of file
@@ -1,19 +1,66 @@
 import os
+import time
 import logging
+import argparse
+import contextvars
+import pandas as pd
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
 from sqlalchemy import text
-from extract import create_conn, db_schema, load_csv_to_db, extract_raw_from_db
-from transform import cleaning, create_star_schema, create_star_schema_tables
+from extract import (
+    create_conn,
+    db_schema,
+    load_csv_to_db,
+    extract_raw_from_db,
+    stream_csv_to_db,
+    stream_raw_from_db,
+    RAW_ZONE,
+    RAW_AUDIT,
+    DELIVERIES_SCHEMA,
+    land_raw_zone,
+    iter_raw_zone,
+    read_raw_zone,
+    start_raw_audit,
+    wait_for_raw_audit)
+from transform import (
+    cleaning,
+    parallel_cleaning,
+    clean_batches,
+    create_star_schema,
+    create_star_schema_tables,
+    drop_fact_indexes,
+    create_fact_indexes)
+from incremental import (
+    LOAD_MODE,
+    source_changed,
+    source_fingerprint,
+    filter_new_deliveries,
+    save_pipeline_state)
 from load import (
-    populate_dim_delivery_person,
-    populate_dim_location, 
-    populate_dim_datetime, 
-    populate_dim_vehicle, 
-    populate_fact_deliveries)
+    populate_dimensions,
+    populate_fact_deliveries,
+    prepare_facts,
+    refresh_delivery_aggregates,
+    fetch_new_dimension_keys,
+    resolve_surrogate_keys,
+    build_fact_frame,
+    write_fact_deliveries)
+from pipeline import PIPELINED, run_pipeline
+from quality import start_quarantine
+from backfill import parse_date_range, read_source_range, replace_fact_range
+from warehouse import create_warehouse_conn, export_parquet
+from db import pool_stats
+from keys import KEY_MODE
+from metrics import tracked, write_metrics
+from profiling import enable_profiling
+from cache import read_cached, write_cache
 
 load_dotenv()
 logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
 
+# read, write and hand over the source in ETL_CHUNK_SIZE batches
+STREAMING = os.getenv("ETL_STREAMING", "false").lower() == "true"
+
 def clear_all_tables(engine):
     logging.info(" CLEARING ALL TABLES TO PREVENT DUPLICATION ")
     
@@ -22,15 +69,19 @@ def clear_all_tables(engine):
         'star_schema.dim_delivery_person', 
         'star_schema.dim_location',
         'star_schema.dim_datetime',
-        'star_schema.dim_vehicle'
+        'star_schema.dim_vehicle',
+        'star_schema.agg_daily_delivery_stats',
+        'star_schema.agg_refresh_state'
     ]
     
     try:
         with engine.connect() as conn:
             transaction = conn.begin()
             try:
+                # DuckDB has no foreign keys to cascade to and keeps its sequences
+                options = "" if engine.dialect.name == "duckdb" else " RESTART IDENTITY CASCADE"
                 for table in tables_to_clear:
-                    conn.execute(text(f"TRUNCATE TABLE {table} RESTART IDENTITY CASCADE;"))
+                    conn.execute(text(f"TRUNCATE TABLE {table}{options};"))
                     logging.info(f"✅ Cleared table: {table}")
                 
                 transaction.commit()
@@ -45,13 +96,32 @@ def clear_all_tables(engine):
         logging.error(f"FAILED TO CLEAR TABLES: {e}")
         raise e
 
-def Extract(engine):
+@tracked()
+def Extract(engine, fingerprint=None):
     logging.info(" STARTING EXTRACTION PHASE ")
     
     try:
         # Create schema
         db_schema(engine)
         
+        if RAW_ZONE:
+            # Land the CSV as Parquet; the raw table is written in the background
+            land_raw_zone(fingerprint)
+            if RAW_AUDIT:
+                start_raw_audit(engine)
+            
+            logging.info("EXTRACTION PHASE COMPLETED (raw zone)")
+            return iter_raw_zone() if STREAMING else read_raw_zone()
+        
+        if STREAMING:
+            # Load CSV to database chunk by chunk
+            for _ in stream_csv_to_db(engine):
+                pass
+            
+            # Raw data is read lazily, one batch at a time
+            logging.info("EXTRACTION PHASE COMPLETED (streaming)")
+            return stream_raw_from_db(engine)
+        
         # Load CSV to database
         load_csv_to_db(engine)
         
@@ -65,26 +135,52 @@ def Extract(engine):
         logging.error(f"EXTRACTION PHASE FAILED: {e}")
         raise e
 
-def Transform(engine, raw_df):
+def prepare_warehouse(engine, cleaned_df, fingerprint):
+    raw_records = cleaned_df.attrs["raw_records"]
+    
+    # Create star schema
+    create_star_schema(engine)
+    
+    # Create star schema tables
+    create_star_schema_tables(engine)
+    
+    if LOAD_MODE == "incremental":
+        # Keep the warehouse, only hand new deliveries to Load
+        cleaned_df = filter_new_deliveries(cleaned_df, engine)
+    else:
+        # Clear all existing data to prevent duplication
+        clear_all_tables(engine)
+    cleaned_df.attrs["raw_records"] = raw_records
+    cleaned_df.attrs["source_fingerprint"] = fingerprint
+    return cleaned_df
+
+@tracked()
+def Transform(engine, raw_df, fingerprint=None, warehouse=None):
     logging.info(" STARTING TRANSFORMATION PHASE ")
     
     try:
+        # Rejected rows replace what earlier runs quarantined from this source
+        fingerprint = fingerprint or source_fingerprint()
+        start_quarantine(engine, list(DELIVERIES_SCHEMA), fingerprint)
+        
         # Clean and transform data
-        cleaned_df = cleaning(raw_df)
+        if isinstance(raw_df, pd.DataFrame):
+            raw_records = len(raw_df)
+            cleaned_df = parallel_cleaning(raw_df, engine=engine)
+        else:
+            cleaned_df, raw_records = clean_batches(raw_df, engine)
+        cleaned_df.attrs["raw_records"] = raw_records
         
-        # Create star schema
-        create_star_schema(engine)
+        # Keep the cleaned frame for later runs over the same source
+        write_cache(cleaned_df, fingerprint)
         
-        # Create star schema tables
-        create_star_schema_tables(engine)
-        
-        # Clear all existing data to prevent duplication
-        clear_all_tables(engine)
+        # the star schema may live outside the raw database
+        cleaned_df = prepare_warehouse(warehouse or engine, cleaned_df, fingerprint)
         
         logging.info(" TRANSFORMATION PHASE COMPLETED ")
-        logging.info(f"Original records: {len(raw_df)}")
+        logging.info(f"Original records: {raw_records}")
         logging.info(f"Cleaned records: {len(cleaned_df)}")
-        logging.info(f"Data reduction: {len(raw_df) - len(cleaned_df)} records removed")
+        logging.info(f"Data reduction: {raw_records - len(cleaned_df)} records removed")
         
         return cleaned_df
         
@@ -92,6 +188,7 @@ def Transform(engine, raw_df):
         logging.error(f"TRANSFORMATION PHASE FAILED: {e}")
         raise e
 
+@tracked()
 def Load(engine, cleaned_df):
     
     logging.info(" STARTING LOADING PHASE ")
@@ -99,49 +196,252 @@ def Load(engine, cleaned_df):
     try:
         # Populate dimension tables
         logging.info("Populating dimension tables...")
-        populate_dim_delivery_person(cleaned_df, engine)
-        populate_dim_location(cleaned_df, engine)
-        populate_dim_datetime(cleaned_df, engine)
-        populate_dim_vehicle(cleaned_df, engine)
+        prepared = None
+        if KEY_MODE == "hash":
+            # hash keys need no lookups, so the fact frame is built while the dimensions are written
+            with ThreadPoolExecutor(max_workers=1, thread_name_prefix="fact_keys") as pool:
+                facts = pool.submit(contextvars.copy_context().run, prepare_facts, cleaned_df, engine)
+                timings = populate_dimensions(cleaned_df, engine)
+                prepared = facts.result()
+        else:
+            timings = populate_dimensions(cleaned_df, engine)
         
-        # Populate fact table
+        # Populate fact table; a full reload builds the foreign-key indexes
+        # once at the end instead of maintaining them row by row
         logging.info("Populating fact table...")
-        populate_fact_deliveries(cleaned_df, engine)
+        start = time.perf_counter()
+        defer_indexes = LOAD_MODE != "incremental"
+        if defer_indexes:
+            drop_fact_indexes(engine)
+        try:
+            facts_loaded = populate_fact_deliveries(cleaned_df, engine, prepared)
+        finally:
+            if defer_indexes:
+                create_fact_indexes(engine)
+        timings['fact_deliveries'] = time.perf_counter() - start
+        
+        # Fold the facts written since the last refresh into the daily aggregate
+        start = time.perf_counter()
+        refresh_delivery_aggregates(engine)
+        timings['aggregates'] = time.perf_counter() - start
+        logging.info(f"Load timings: " + ", ".join(f"{name} {seconds:.2f}s" for name, seconds in timings.items()))
+        
+        # Record what has been loaded for the next incremental run
+        if "source_fingerprint" in cleaned_df.attrs:
+            last_order_date = cleaned_df["Order_Date"].max() if len(cleaned_df) else None
+            save_pipeline_state(engine, cleaned_df.attrs["source_fingerprint"],
+                                None if pd.isna(last_order_date) else last_order_date.date(),
+                                facts_loaded)
+        
+        # Columnar targets also get a Parquet copy for external readers
+        export_parquet(engine)
         
         logging.info(" LOADING PHASE COMPLETED ")
         logging.info(f"Total records processed: {len(cleaned_df)}")
+        return facts_loaded
         
     except Exception as e:
         logging.error(f"LOADING PHASE FAILED: {e}")
         raise e
 
-def main():
+@tracked()
+def Pipelined(engine, fingerprint=None, warehouse=None):
+    logging.info(" STARTING PIPELINED ETL ")
+    
+    try:
+        # Create schemas and tables up front, the stages only write batches;
+        # raw data stays on engine, the star schema goes to warehouse
+        warehouse = warehouse or engine
+        db_schema(engine)
+        create_star_schema(warehouse)
+        create_star_schema_tables(warehouse)
+        fingerprint = fingerprint or source_fingerprint()
+        if LOAD_MODE != "incremental":
+            clear_all_tables(warehouse)
+        start_quarantine(engine, list(DELIVERIES_SCHEMA), fingerprint)
+        
+        if RAW_ZONE:
+            land_raw_zone(fingerprint)
+            if RAW_AUDIT:
+                start_raw_audit(engine)
+            source = iter_raw_zone()
+        else:
+            # each chunk is copied into the raw table before it is handed on
+            source = stream_csv_to_db(engine)
+        
+        totals = {"raw_records": 0, "cleaned_records": 0, "facts_loaded": 0, "last_order_date": None}
+        # keys of the dimension rows written so far, read by the keys stage only
+        dimension_keys = None
+        unmatched = {}
+        
+        def clean(batch):
+            totals["raw_records"] += len(batch)
+            cleaned = cleaning(batch, engine)
+            if LOAD_MODE == "incremental":
+                cleaned = filter_new_deliveries(cleaned, warehouse)
+            totals["cleaned_records"] += len(cleaned)
+            return cleaned if len(cleaned) else None
+        
+        def resolve_keys(batch):
+            nonlocal dimension_keys
+            # upserts are idempotent, so later batches see and reuse the rows earlier ones created
+            populate_dimensions(batch, warehouse, workers=1)
+            if KEY_MODE != "hash":
+                dimension_keys = fetch_new_dimension_keys(warehouse, dimension_keys)
+            facts, batch_unmatched = resolve_surrogate_keys(batch, warehouse, dimension_keys)
+            for key_column, count in batch_unmatched.items():
+                unmatched[key_column] = unmatched.get(key_column, 0) + count
+            return build_fact_frame(facts)
+        
+        def write(fact_df):
+            # facts repeated in a later batch are skipped on (delivery_id, order_date)
+            totals["facts_loaded"] += write_fact_deliveries(fact_df, warehouse)
+            last_order_date = fact_df["order_date"].max()
+            if totals["last_order_date"] is None or last_order_date > totals["last_order_date"]:
+                totals["last_order_date"] = last_order_date
+            return fact_df
+        
+        # a full reload builds the foreign-key indexes once at the end
+        defer_indexes = LOAD_MODE != "incremental"
+        if defer_indexes:
+            drop_fact_indexes(warehouse)
+        try:
+            run_pipeline(source, [("clean", clean), ("resolve_keys", resolve_keys), ("write", write)])
+        finally:
+            if defer_indexes:
+                create_fact_indexes(warehouse)
+        
+        refresh_delivery_aggregates(warehouse)
+        last_order_date = totals["last_order_date"]
+        save_pipeline_state(warehouse, fingerprint,
+                            None if last_order_date is None else last_order_date.date(),
+                            totals["facts_loaded"])
+        export_parquet(warehouse)
+        
+        logging.info(" PIPELINED ETL COMPLETED ")
+        logging.info(f"   - Raw records processed: {totals['raw_records']}")
+        logging.info(f"   - Clean records: {totals['cleaned_records']}")
+        logging.info(f"   - Facts loaded: {totals['facts_loaded']}")
+        logging.info(f"   - Unmatched dimension keys: {unmatched}")
+        return totals["facts_loaded"]
+        
+    except Exception as e:
+        logging.error(f"PIPELINED ETL FAILED: {e}")
+        raise e
+
+@tracked()
+def Backfill(engine, start, end, warehouse=None):
+    logging.info(f" STARTING BACKFILL {start.date()} .. {end.date()} ")
+    
+    try:
+        # Only the facts ordered in the range are rebuilt, the rest of the
+        # warehouse, the dimensions and the incremental state are kept
+        warehouse = warehouse or engine
+        create_star_schema(warehouse)
+        create_star_schema_tables(warehouse)
+        
+        # The cached cleaned frame is reused when the source is unchanged
+        fingerprint = source_fingerprint()
+        cleaned_df = read_cached(fingerprint)
+        if cleaned_df is None:
+            db_schema(engine)
+            start_quarantine(engine, list(DELIVERIES_SCHEMA), fingerprint, start=start, end=end)
+            raw_df = read_source_range(start, end, fingerprint)
+            cleaned_df = parallel_cleaning(raw_df, engine=engine) if len(raw_df) else raw_df
+        else:
+            logging.info(" CLEANED DATA CACHED - SOURCE NOT RE-READ ")
+            cleaned_df = cleaned_df[cleaned_df["Order_Date"].between(start, end)]
+        
+        # Dimensions are upserted, members no longer used by any fact stay
+        fact_df = None
+        if len(cleaned_df):
+            populate_dimensions(cleaned_df, warehouse)
+            fact_df, unmatched = prepare_facts(cleaned_df, warehouse)
+            logging.info(f"Unmatched dimension keys: {unmatched}")
+        removed, written = replace_fact_range(warehouse, fact_df, start, end)
+        
+        # Columnar targets also get a Parquet copy for external readers
+        export_parquet(warehouse)
+        
+        logging.info(" BACKFILL COMPLETED ")
+        logging.info(f"   - Clean records in range: {len(cleaned_df)}")
+        logging.info(f"   - Facts removed: {removed}, written: {written}")
+        return written
+        
+    except Exception as e:
+        logging.error(f"BACKFILL FAILED: {e}")
+        raise e
+
+def main(profile_stages=None, backfill=None):
     logging.info(" STARTING FOOD DELIVERY ETL PIPELINE ")
     
     try:
+        # Stages given on the command line override ETL_PROFILE_STAGES
+        if profile_stages:
+            enable_profiling(profile_stages)
+        
         # Create database connection
         engine = create_conn()
+        # Star schema target, the same engine unless ETL_WAREHOUSE points elsewhere
+        warehouse = create_warehouse_conn(engine)
+        
+        if backfill:
+            # Reprocess one Order_Date range in place of a full or incremental run
+            Backfill(engine, *parse_date_range(*backfill), warehouse)
+            logging.info(" ETL PIPELINE COMPLETED SUCCESSFULLY! ")
+            return
+        
+        if LOAD_MODE == "incremental":
+            create_star_schema(warehouse)
+            create_star_schema_tables(warehouse)
+            if not source_changed(warehouse):
+                logging.info(" SOURCE FILE UNCHANGED SINCE LAST RUN - NOTHING TO LOAD ")
+                return
+        
+        fingerprint = source_fingerprint()
+        if PIPELINED:
+            # Batches flow through extract, transform and load concurrently
+            Pipelined(engine, fingerprint, warehouse)
+            logging.info(" ETL PIPELINE COMPLETED SUCCESSFULLY! ")
+            return
         
-        # Run ETL phases
-        raw_df = Extract(engine)
-        cleaned_df = Transform(engine, raw_df)
-        Load(engine, cleaned_df)
+        # Run ETL phases; an unchanged source and cleaning code reuse the cached cleaned frame
+        cleaned_df = read_cached(fingerprint)
+        if cleaned_df is None:
+            raw_df = Extract(engine, fingerprint)
+            cleaned_df = Transform(engine, raw_df, fingerprint, warehouse)
+        else:
+            logging.info(" CLEANED DATA CACHED - EXTRACT AND TRANSFORM SKIPPED ")
+            cleaned_df = prepare_warehouse(warehouse, cleaned_df, fingerprint)
+        Load(warehouse, cleaned_df)
+        raw_records = cleaned_df.attrs["raw_records"]
         
         logging.info(" ETL PIPELINE COMPLETED SUCCESSFULLY! ")
         logging.info(f"✅ Final Summary:")
-        logging.info(f"   - Raw records processed: {len(raw_df)}")
+        logging.info(f"   - Raw records processed: {raw_records}")
         logging.info(f"   - Clean records loaded: {len(cleaned_df)}")
-        logging.info(f"   - Data quality improvement: {((len(cleaned_df)/len(raw_df))*100):.2f}% retention rate")
+        logging.info(f"   - Data quality improvement: {((len(cleaned_df)/raw_records)*100):.2f}% retention rate")
         
     except Exception as e:
         logging.error(f"❌ ETL PIPELINE FAILED: {e}")
         raise e
     
     finally:
-        # Close database connection if exists
+        # Close database connection if exists, once the raw audit copy is done
+        wait_for_raw_audit()
+        if 'warehouse' in locals() and warehouse is not engine:
+            warehouse.dispose()
         if 'engine' in locals():
+            logging.info(f"Connection pool: {pool_stats(engine)}")
             engine.dispose()
             logging.info("Database connections closed")
+        write_metrics()
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="Run the food delivery ETL pipeline")
+    parser.add_argument("--profile", metavar="STAGES",
+                        help="comma separated stages to profile, e.g. cleaning,populate_fact_deliveries or all")
+    parser.add_argument("--backfill", nargs=2, metavar=("START", "END"),
+                        help="reprocess only the deliveries ordered between START and END (YYYY-MM-DD, inclusive)")
+    args = parser.parse_args()
+    main(profile_stages=args.profile, backfill=args.backfill)
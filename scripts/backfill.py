@@ -0,0 +1,93 @@
+import logging
+import pandas as pd
+from sqlalchemy import text
+from dotenv import load_dotenv
+from bulk import affected_rows
+from extract import RAW_ZONE, land_raw_zone, iter_raw_zone, read_deliveries_csv
+from transform import parse_order_dates, fact_partition_name
+from load import write_fact_deliveries, refresh_delivery_aggregates
+
+load_dotenv()
+logging.basicConfig(level=logging.INFO , format="%(asctime)s - %(levelname)s - %(message)s")
+
+STAR_SCHEMA = "star_schema"
+
+DELETE_AGGREGATE_RANGE = text(f"""
+    DELETE FROM {STAR_SCHEMA}.agg_daily_delivery_stats WHERE order_date BETWEEN :start AND :end
+""")
+DELETE_FACT_RANGE = text(f"""
+    DELETE FROM {STAR_SCHEMA}.fact_deliveries WHERE order_date BETWEEN :start AND :end
+""")
+
+
+def parse_date_range(start, end):
+    # both ends are order dates and both are included
+    start, end = pd.Timestamp(start).normalize(), pd.Timestamp(end).normalize()
+    if end < start:
+        raise ValueError(f"Backfill range ends ({end.date()}) before it starts ({start.date()})")
+    return start, end
+
+
+def range_months(start, end):
+    return pd.period_range(start, end, freq="M")
+
+
+def select_date_range(df, start, end):
+    # rows whose Order_Date does not parse belong to no range
+    order_dates = parse_order_dates(df["Order_Date"])
+    return df[order_dates.between(start, end).to_numpy()]
+
+
+def read_source_range(start, end, fingerprint=None):
+    # the raw zone is read for the range's months only, the CSV is read and filtered
+    try:
+        if RAW_ZONE:
+            land_raw_zone(fingerprint)
+            batches = list(iter_raw_zone(months=range_months(start, end).strftime("%Y-%m").tolist()))
+            raw_df = pd.concat(batches, ignore_index=True) if batches else pd.DataFrame(columns=["Order_Date"])
+        else:
+            raw_df = read_deliveries_csv()
+        raw_df = select_date_range(raw_df, start, end)
+        logging.info(f"{len(raw_df)} source records between {start.date()} and {end.date()}")
+        return raw_df
+
+    except Exception as e:
+        logging.error(f"Failed to read the source for {start.date()}..{end.date()}: {e}")
+        raise e
+
+
+def _clear_fact_range(conn, start, end):
+    # months the range covers whole are emptied with TRUNCATE on their
+    # partition, the days at either end with a DELETE pruned to theirs
+    removed = 0
+    if conn.dialect.name == "postgresql":
+        for month in range_months(start, end):
+            if month.start_time < start or month.end_time.normalize() > end:
+                continue
+            partition = fact_partition_name(month)
+            exists = conn.execute(text("SELECT to_regclass(:partition)"),
+                                  {"partition": f"{STAR_SCHEMA}.{partition}"}).scalar()
+            if exists:
+                removed += conn.execute(text(f"SELECT COUNT(*) FROM {STAR_SCHEMA}.{partition}")).scalar()
+                conn.execute(text(f"TRUNCATE TABLE {STAR_SCHEMA}.{partition}"))
+    deleted = conn.execute(DELETE_FACT_RANGE, {"start": start.date(), "end": end.date()})
+    return removed + affected_rows(conn, deleted)
+
+
+def replace_fact_range(engine, fact_df, start, end):
+    # the range's facts and daily aggregates are swapped in one transaction,
+    # readers see either the old days or the new ones
+    try:
+        # everything loaded so far is folded first, so the refresh below folds only the new facts
+        refresh_delivery_aggregates(engine)
+        with engine.begin() as conn:
+            conn.execute(DELETE_AGGREGATE_RANGE, {"start": start.date(), "end": end.date()})
+            removed = _clear_fact_range(conn, start, end)
+            written = write_fact_deliveries(fact_df, conn) if fact_df is not None and len(fact_df) else 0
+            refresh_delivery_aggregates(conn)
+        logging.info(f"Facts {start.date()}..{end.date()} replaced: {removed} removed, {written} written")
+        return removed, written
+
+    except Exception as e:
+        logging.error(f"Failed to replace facts {start.date()}..{end.date()}, nothing changed: {e}")
+        raise e
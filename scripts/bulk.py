@@ -0,0 +1,146 @@
+import io
+import os
+import logging
+from contextlib import contextmanager, nullcontext
+from sqlalchemy import text
+from sqlalchemy.engine import Engine
+from dotenv import load_dotenv
+from metrics import record_round_trips
+
+load_dotenv()
+logging.basicConfig(level=logging.INFO , format="%(asctime)s - %(levelname)s - %(message)s")
+
+BATCH_SIZE = int(os.getenv("ETL_COPY_BATCH_SIZE", "50000"))
+NULL_MARKER = "\\N"
+# concurrent upserts into one table take turns on this lock
+ADVISORY_LOCK = text("SELECT pg_advisory_xact_lock(hashtext(:table))")
+
+
+@contextmanager
+def transaction_scope(connectable):
+    # engines get their own transaction, connections are used as-is
+    if isinstance(connectable, Engine):
+        with connectable.begin() as conn:
+            yield conn
+    else:
+        yield connectable
+
+
+def qualified_name(table, schema):
+    return f"{schema}.{table}" if schema else table
+
+
+def quote_columns(columns):
+    return ", ".join('"' + str(column).replace('"', '""') + '"' for column in columns)
+
+
+def affected_rows(conn, result):
+    # rows an INSERT, UPDATE or DELETE touched; DuckDB reports them as a result
+    # row rather than a rowcount, so call this before the next statement
+    if conn.dialect.name == "duckdb":
+        return result.scalar()
+    return result.rowcount
+
+
+def _copy_batches(conn, df, target, batch_size):
+    copy_sql = (f"COPY {target} ({quote_columns(df.columns)}) "
+                f"FROM STDIN WITH (FORMAT csv, NULL '{NULL_MARKER}')")
+    cursor = conn.connection.cursor()
+    try:
+        for start in range(0, len(df), batch_size):
+            buffer = io.StringIO()
+            df.iloc[start:start + batch_size].to_csv(buffer, index=False, header=False,
+                                                      na_rep=NULL_MARKER)
+            buffer.seek(0)
+            cursor.copy_expert(copy_sql, buffer)
+            # COPY goes through the raw cursor, past the SQLAlchemy event hooks
+            record_round_trips()
+    finally:
+        cursor.close()
+
+
+@contextmanager
+def _registered_frame(conn, df, name):
+    # DuckDB scans the frame in place as a view, nothing is serialized
+    conn.connection.register(name, df)
+    try:
+        yield name
+    finally:
+        conn.connection.unregister(name)
+
+
+def copy_dataframe(df, connectable, table, schema, if_exists="append", batch_size=BATCH_SIZE, dtype=None):
+    try:
+        with transaction_scope(connectable) as conn:
+            if if_exists == "replace":
+                # let pandas derive the table definition, then stream the rows
+                df.head(0).to_sql(name=table, con=conn, schema=schema,
+                                  if_exists="replace", index=False, dtype=dtype)
+
+            if conn.dialect.name == "postgresql":
+                _copy_batches(conn, df, qualified_name(table, schema), batch_size)
+            elif conn.dialect.name == "duckdb":
+                with _registered_frame(conn, df, f"_copy_{table}") as view:
+                    conn.execute(text(f"""
+                        INSERT INTO {qualified_name(table, schema)} ({quote_columns(df.columns)})
+                        SELECT {quote_columns(df.columns)} FROM {view}
+                    """))
+            else:
+                df.to_sql(name=table, con=conn, schema=schema, if_exists="append",
+                          index=False, chunksize=batch_size)
+
+        logging.info(f"Copied {len(df)} rows into {qualified_name(table, schema)}")
+        return len(df)
+
+    except Exception as e:
+        logging.error(f"Bulk copy into {qualified_name(table, schema)} failed: {e}")
+        raise e
+
+
+def upsert_dataframe(df, connectable, table, schema, conflict_columns, update_columns=None,
+                     batch_size=BATCH_SIZE, serialize=False):
+    # stage the frame, then INSERT ... ON CONFLICT against the target's natural key;
+    # serialize makes concurrent upserts into the table take turns, so loads
+    # inserting overlapping keys in different orders cannot deadlock
+    stage = f"_stage_{table}"
+    columns = quote_columns(df.columns)
+    if update_columns:
+        action = "DO UPDATE SET " + ", ".join(
+            f'"{column}" = EXCLUDED."{column}"' for column in update_columns)
+    else:
+        action = "DO NOTHING"
+
+    try:
+        with transaction_scope(connectable) as conn:
+            registered = nullcontext()
+            if conn.dialect.name == "postgresql":
+                conn.execute(text(f"""
+                    CREATE TEMP TABLE {stage} ON COMMIT DROP AS
+                    SELECT {columns} FROM {schema}.{table} WITH NO DATA
+                """))
+                _copy_batches(conn, df, stage, batch_size)
+                if serialize:
+                    conn.execute(ADVISORY_LOCK, {"table": f"{schema}.{table}"})
+            elif conn.dialect.name == "duckdb":
+                registered = _registered_frame(conn, df, stage)
+            else:
+                df.to_sql(name=stage, con=conn, if_exists="replace", index=False,
+                          chunksize=batch_size)
+
+            with registered:
+                result = conn.execute(text(f"""
+                    INSERT INTO {schema}.{table} ({columns})
+                    SELECT {columns} FROM {stage} WHERE true
+                    ON CONFLICT ({quote_columns(conflict_columns)}) {action}
+                """))
+                written = affected_rows(conn, result)
+
+            if conn.dialect.name not in ("postgresql", "duckdb"):
+                conn.execute(text(f"DROP TABLE {stage}"))
+
+        logging.info(f"Upserted {written} of {len(df)} rows into {schema}.{table}")
+        return written
+
+    except Exception as e:
+        logging.error(f"Bulk upsert into {schema}.{table} failed: {e}")
+        raise e
@@ -0,0 +1,142 @@
+import os
+import json
+import shutil
+import hashlib
+import logging
+from datetime import datetime, timezone
+import pandas as pd
+from dotenv import load_dotenv
+from extract import CSV_READER, RAW_ZONE
+from quality import RULES, QUARANTINE
+
+load_dotenv()
+logging.basicConfig(level=logging.INFO , format="%(asctime)s - %(levelname)s - %(message)s")
+
+# cleaned frames keyed by source content and cleaning code, reused while neither changes
+CACHE_ENABLED = os.getenv("ETL_CACHE", "true").lower() == "true"
+CACHE_DIR = os.getenv("ETL_CACHE_DIR", "data/cache")
+CACHE_MAX_ENTRIES = int(os.getenv("ETL_CACHE_MAX_ENTRIES", "3"))
+CACHE_MAX_BYTES = int(os.getenv("ETL_CACHE_MAX_BYTES", str(2 * 1024 ** 3)))
+META_FILE = "meta.json"
+DATA_FILE = "cleaned.parquet"
+
+# the reader, cleaning and validation code live here; any edit invalidates every entry
+CODE_FILES = [os.path.join(os.path.dirname(os.path.abspath(__file__)), name)
+              for name in ["extract.py", "transform.py", "quality.py"]]
+
+
+def cleaning_settings():
+    # what the code files leave to the environment: the effective rules
+    # (ETL_MAX_PICKUP_MINUTES and the rest), the reader and its types, quarantining
+    return json.dumps({"rules": RULES, "csv_reader": CSV_READER, "raw_zone": RAW_ZONE,
+                       "quarantine": QUARANTINE}, sort_keys=True, default=str)
+
+
+def code_version():
+    digest = hashlib.sha256(pd.__version__.encode())
+    for path in CODE_FILES:
+        with open(path, "rb") as source:
+            digest.update(source.read())
+    digest.update(cleaning_settings().encode())
+    return digest.hexdigest()
+
+
+def cache_key(fingerprint):
+    # content and size only, so touching the file does not invalidate the entry
+    key = f"{fingerprint['source_sha256']}:{fingerprint['source_size']}:{code_version()}"
+    return hashlib.sha256(key.encode()).hexdigest()[:32]
+
+
+def _entry_path(key):
+    return os.path.join(CACHE_DIR, key)
+
+
+def is_cached(fingerprint):
+    return CACHE_ENABLED and os.path.exists(os.path.join(_entry_path(cache_key(fingerprint)), META_FILE))
+
+
+def read_cached(fingerprint):
+    if not CACHE_ENABLED:
+        return None
+    path = _entry_path(cache_key(fingerprint))
+    meta_path = os.path.join(path, META_FILE)
+    if not os.path.exists(meta_path):
+        logging.info("Cleaned data cache miss")
+        return None
+
+    try:
+        with open(meta_path) as meta_file:
+            meta = json.load(meta_file)
+        df = pd.read_parquet(os.path.join(path, DATA_FILE))
+        df.attrs.update(meta["attrs"])
+        # the marker's mtime is the entry's last use, eviction drops the oldest first
+        os.utime(meta_path)
+        logging.info(f"Cleaned data cache hit: {len(df)} records from {path}")
+        return df
+
+    except Exception as e:
+        # a broken entry is dropped and the run falls back to extract and transform
+        logging.warning(f"Discarding unreadable cache entry {path}: {e}")
+        shutil.rmtree(path, ignore_errors=True)
+        return None
+
+
+def write_cache(df, fingerprint):
+    if not CACHE_ENABLED:
+        return None
+    path = _entry_path(cache_key(fingerprint))
+    tmp_path = f"{path}.tmp"
+    try:
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        os.makedirs(tmp_path)
+        df.to_parquet(os.path.join(tmp_path, DATA_FILE), index=False)
+        with open(os.path.join(tmp_path, META_FILE), "w") as meta_file:
+            json.dump({
+                "rows": len(df),
+                "created_at": datetime.now(timezone.utc).isoformat(),
+                "code_version": code_version(),
+                "fingerprint": fingerprint,
+                "attrs": dict(df.attrs)
+            }, meta_file, default=str)
+
+        shutil.rmtree(path, ignore_errors=True)
+        os.replace(tmp_path, path)
+        logging.info(f"Cached {len(df)} cleaned records at {path}")
+        evict()
+        return path
+
+    except Exception as e:
+        # caching is an optimisation, a failed write never fails the run
+        logging.error(f"Failed to cache cleaned data: {e}")
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        return None
+
+
+def _entry_size(path):
+    return sum(entry.stat().st_size for entry in os.scandir(path) if entry.is_file())
+
+
+def evict(max_entries=CACHE_MAX_ENTRIES, max_bytes=CACHE_MAX_BYTES):
+    if not os.path.isdir(CACHE_DIR):
+        return []
+    entries = []
+    for entry in os.scandir(CACHE_DIR):
+        meta_path = os.path.join(entry.path, META_FILE)
+        if entry.is_dir() and os.path.exists(meta_path):
+            entries.append((os.path.getmtime(meta_path), entry.path))
+
+    # most recently used first; keep entries while both limits hold
+    entries.sort(reverse=True)
+    kept_bytes = 0
+    evicted = []
+    for position, (_, path) in enumerate(entries):
+        size = _entry_size(path)
+        if position < max_entries and kept_bytes + size <= max_bytes:
+            kept_bytes += size
+            continue
+        shutil.rmtree(path, ignore_errors=True)
+        evicted.append(path)
+
+    if evicted:
+        logging.info(f"Evicted {len(evicted)} cache entries, {kept_bytes} bytes kept")
+    return evicted
@@ -0,0 +1,107 @@
+import os
+import time
+import logging
+import threading
+from sqlalchemy import create_engine
+from sqlalchemy.engine import make_url
+from sqlalchemy.pool import QueuePool
+from dotenv import load_dotenv
+from metrics import record_pool_checkout
+
+load_dotenv()
+logging.basicConfig(level=logging.INFO , format="%(asctime)s - %(levelname)s - %(message)s")
+
+#sqlalchemy conn
+SQL_CONN = os.getenv("AIRFLOW__DATABASE__SQL_ALCHEMY_CONN")
+
+# one engine per process and URL, shared by every stage and task that connects;
+# size the pool for the most connections a run holds at once (dimension
+# workers, pipeline stages) plus a little overflow
+POOL_SIZE = int(os.getenv("ETL_POOL_SIZE", "5"))
+POOL_MAX_OVERFLOW = int(os.getenv("ETL_POOL_MAX_OVERFLOW", "10"))
+POOL_TIMEOUT = int(os.getenv("ETL_POOL_TIMEOUT", "30"))
+POOL_RECYCLE = int(os.getenv("ETL_POOL_RECYCLE", "1800"))
+POOL_PRE_PING = os.getenv("ETL_POOL_PRE_PING", "true").lower() == "true"
+# psycopg2 only: values_plus_batch sends executemany INSERTs as execute_values
+# pages and other statements as execute_batch pages
+EXECUTEMANY_MODE = os.getenv("ETL_EXECUTEMANY_MODE", "values_plus_batch")
+EXECUTEMANY_PAGE_SIZE = int(os.getenv("ETL_EXECUTEMANY_PAGE_SIZE", "1000"))
+# compiled statements kept per engine, so a statement repeated per batch compiles once
+STATEMENT_CACHE_SIZE = int(os.getenv("ETL_STATEMENT_CACHE_SIZE", "500"))
+
+_engines = {}
+_engines_pid = None
+_engines_lock = threading.Lock()
+
+
+def _new_pool_stats():
+    return {"checkouts": 0, "wait_seconds": 0.0, "max_wait_seconds": 0.0, "peak_checked_out": 0}
+
+
+_pool_stats = _new_pool_stats()
+_stats_lock = threading.Lock()
+
+
+class TimedQueuePool(QueuePool):
+    # a QueuePool that times every checkout: the wait for a free connection,
+    # or for a new one to be opened when the pool has room to grow
+    def _do_get(self):
+        start = time.perf_counter()
+        connection = super()._do_get()
+        wait = time.perf_counter() - start
+        with _stats_lock:
+            _pool_stats["checkouts"] += 1
+            _pool_stats["wait_seconds"] += wait
+            _pool_stats["max_wait_seconds"] = max(_pool_stats["max_wait_seconds"], wait)
+            _pool_stats["peak_checked_out"] = max(_pool_stats["peak_checked_out"], self.checkedout())
+        record_pool_checkout(wait)
+        return connection
+
+
+def get_engine(url=None, **engine_options):
+    # options only apply when this process first creates the engine for url
+    global _engines_pid
+    url = url or SQL_CONN
+    with _engines_lock:
+        if _engines_pid != os.getpid():
+            # a forked child leaves its parent's connections alone and opens its own
+            for engine in _engines.values():
+                engine.dispose(close=False)
+            _engines.clear()
+            with _stats_lock:
+                _pool_stats.update(_new_pool_stats())
+            _engines_pid = os.getpid()
+
+        engine = _engines.get(url)
+        if engine is None:
+            options = {
+                "poolclass": TimedQueuePool,
+                "pool_size": POOL_SIZE,
+                "max_overflow": POOL_MAX_OVERFLOW,
+                "pool_timeout": POOL_TIMEOUT,
+                "pool_recycle": POOL_RECYCLE,
+                "pool_pre_ping": POOL_PRE_PING,
+                "query_cache_size": STATEMENT_CACHE_SIZE
+            }
+            if make_url(url).get_driver_name() == "psycopg2":
+                options["executemany_mode"] = EXECUTEMANY_MODE
+                options["executemany_values_page_size"] = EXECUTEMANY_PAGE_SIZE
+            options.update(engine_options)
+            engine = create_engine(url, **options)
+            _engines[url] = engine
+            logging.info(f"Engine created: pool size {options['pool_size']}, "
+                         f"overflow {options['max_overflow']}, pre-ping {options['pool_pre_ping']}")
+        return engine
+
+
+def pool_stats(engine=None):
+    # checkouts and wait times since the process started, plus the pool's current state
+    with _stats_lock:
+        stats = dict(_pool_stats)
+    stats["wait_seconds"] = round(stats["wait_seconds"], 6)
+    stats["max_wait_seconds"] = round(stats["max_wait_seconds"], 6)
+    if engine is not None and isinstance(engine.pool, QueuePool):
+        # overflow counts up from -pool_size, only connections beyond the pool are reported
+        stats.update(size=engine.pool.size(), checked_out=engine.pool.checkedout(),
+                     overflow=max(engine.pool.overflow(), 0))
+    return stats
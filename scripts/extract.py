@@ -1,23 +1,77 @@
 import os
+import json
+import glob
+import shutil
 import pandas as pd 
+import pyarrow as pa
+import pyarrow.csv as pv
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
 import logging
-from sqlalchemy import create_engine , text
+from concurrent.futures import ThreadPoolExecutor
+from sqlalchemy import text
+from sqlalchemy.types import Time
 from dotenv import load_dotenv
+from bulk import copy_dataframe
+from db import get_engine
+from transform import parse_order_dates
 
 load_dotenv()
 
 logging.basicConfig(level=logging.INFO , format="%(asctime)s - %(levelname)s - %(message)s")
 
-#sqlalchemy conn
-SQL_CONN = os.getenv("AIRFLOW__DATABASE__SQL_ALCHEMY_CONN")
-
 FILE_PATH = "data/source/Deliveries.csv"
 TABLE_NAME= "deliveries_raw"
 RAW_SCHEMA ="raw_data"
+CHUNK_SIZE = int(os.getenv("ETL_CHUNK_SIZE", "100000"))
+
+# land the CSV as month-partitioned Parquet and clean straight from it;
+# the raw table then becomes an audit copy written off the critical path
+RAW_ZONE = os.getenv("ETL_RAW_ZONE", "false").lower() == "true"
+RAW_ZONE_DIR = os.getenv("ETL_RAW_ZONE_DIR", "data/raw/deliveries")
+RAW_AUDIT = os.getenv("ETL_RAW_AUDIT", "true").lower() == "true"
+RAW_ZONE_MARKER = "_SUCCESS"
+UNKNOWN_MONTH = "unknown"
+
+_raw_audit = None
 
-def create_conn():
+# declared types for Deliveries.csv, parsed once by the multi-threaded Arrow
+# reader; "pandas" keeps the old inferring pd.read_csv
+CSV_READER = os.getenv("ETL_CSV_READER", "arrow").lower()
+CATEGORY = pa.dictionary(pa.int32(), pa.string())
+DELIVERIES_SCHEMA = {
+    "ID": pa.string(),
+    "Delivery_person_ID": pa.string(),
+    "Delivery_person_Age": pa.float64(),
+    "Delivery_person_Ratings": pa.float64(),
+    "Restaurant_latitude": pa.float64(),
+    "Restaurant_longitude": pa.float64(),
+    "Delivery_location_latitude": pa.float64(),
+    "Delivery_location_longitude": pa.float64(),
+    "Order_Date": pa.timestamp("ns"),
+    "Time_Orderd": pa.time32("s"),
+    "Time_Order_picked": pa.time32("s"),
+    "Weather_conditions": CATEGORY,
+    "Road_traffic_density": CATEGORY,
+    "Vehicle_condition": pa.int64(),
+    "Type_of_order": CATEGORY,
+    "Type_of_vehicle": CATEGORY,
+    "multiple_deliveries": pa.float64(),
+    "Festival": CATEGORY,
+    "City": CATEGORY,
+    "Time_taken (min)": pa.float64()
+}
+ORDER_DATE_PARSERS = ["%d-%m-%Y", pv.ISO8601]
+TIME_COLUMNS = ["Time_Orderd", "Time_Order_picked"]
+# pd.read_csv's default missing markers; typed columns also take the Kaggle "NaN "
+PANDAS_NA_VALUES = ["", "#N/A", "#N/A N/A", "#NA", "-1.#IND", "-1.#QNAN", "-NaN", "-nan", "1.#IND",
+                    "1.#QNAN", "<NA>", "N/A", "NA", "NULL", "NaN", "None", "n/a", "nan", "null"]
+TYPED_NA_VALUES = PANDAS_NA_VALUES + ["NaN "]
+
+def create_conn(**engine_options):
     try:
-        engine = create_engine(SQL_CONN)
+        # the process-wide engine; disposing it only empties its pool
+        engine = get_engine(**engine_options)
         logging.info("Connected to Database")
         return engine
     except Exception as e:
@@ -39,18 +93,215 @@ def extract_raw_from_db(engine):
         logging.error(f"Failed to extract raw data: {e}")
         raise e
 
-def load_csv_to_db(engine):
+def stream_raw_from_db(engine, chunk_size=CHUNK_SIZE):
+    try:
+        # server-side cursor, only one chunk is held in memory at a time
+        with engine.connect() as conn:
+            conn = conn.execution_options(stream_results=True)
+            total = 0
+            for chunk in pd.read_sql(text(f"SELECT * FROM {RAW_SCHEMA}.{TABLE_NAME}"), conn,
+                                     chunksize=chunk_size):
+                total += len(chunk)
+                yield chunk
+            logging.info(f"Raw data streamed from {RAW_SCHEMA}.{TABLE_NAME} - {total} records")
+    except Exception as e:
+        logging.error(f"Failed to stream raw data: {e}")
+        raise e
+
+def stream_csv_to_db(engine, chunk_size=CHUNK_SIZE):
+    try:
+        total = 0
+        # every column as text so the first chunk's table fits the later ones;
+        # each chunk is written before it is handed to the caller
+        reader = pd.read_csv(FILE_PATH, chunksize=chunk_size, dtype=str)
+        for i, chunk in enumerate(reader):
+            copy_dataframe(chunk, engine, TABLE_NAME, RAW_SCHEMA,
+                           if_exists="replace" if i == 0 else "append")
+            total += len(chunk)
+            yield chunk
+        if total == 0:
+            logging.warning(f"{FILE_PATH} has no rows, {RAW_SCHEMA}.{TABLE_NAME} left unchanged")
+        logging.info(f"Streamed {total} records into {RAW_SCHEMA}.{TABLE_NAME}")
+    except Exception as e:
+        logging.error("CSV stream load failed")
+        raise e
+
+def _convert_options(typed):
+    if typed:
+        # text columns keep "NaN " as a value, as pd.read_csv does; only the
+        # typed columns read it as missing
+        return pv.ConvertOptions(column_types=DELIVERIES_SCHEMA, null_values=TYPED_NA_VALUES,
+                                 strings_can_be_null=False, timestamp_parsers=ORDER_DATE_PARSERS)
+    # every column as text, like pd.read_csv(dtype=str)
+    return pv.ConvertOptions(column_types=dict.fromkeys(DELIVERIES_SCHEMA, pa.string()),
+                             null_values=PANDAS_NA_VALUES, strings_can_be_null=True)
+
+def _text_nulls(array):
+    # pandas' missing markers in a text column become nulls
+    if pa.types.is_dictionary(array.type):
+        missing = pc.is_in(array.dictionary, value_set=pa.array(PANDAS_NA_VALUES))
+        if not pc.any(missing).as_py():
+            return array
+        indices = pc.if_else(pc.take(missing, array.indices), pa.scalar(None, array.indices.type), array.indices)
+        return pa.DictionaryArray.from_arrays(indices, array.dictionary)
+    return pc.if_else(pc.is_in(array, value_set=pa.array(PANDAS_NA_VALUES)), pa.scalar(None, array.type), array)
+
+def restore_text_nulls(table):
+    for position, field in enumerate(table.schema):
+        if pa.types.is_string(field.type) or pa.types.is_dictionary(field.type):
+            column = pa.chunked_array([_text_nulls(chunk) for chunk in table.column(position).chunks],
+                                      type=field.type)
+            table = table.set_column(position, field, column)
+    return table
+
+def read_deliveries_csv(path=None):
+    # typed, multi-threaded read; a file the schema does not fit is read the old way
+    path = path or FILE_PATH
+    if CSV_READER == "arrow":
+        try:
+            table = pv.read_csv(path, convert_options=_convert_options(typed=True))
+            df = restore_text_nulls(table).to_pandas()
+            df.attrs["typed_csv"] = True
+            logging.info(f"Read {len(df)} typed records from {path}")
+            return df
+        except pa.ArrowInvalid as e:
+            logging.warning(f"{path} does not fit the declared schema, reading it untyped: {e}")
+    return pd.read_csv(path)
+
+def iter_csv_tables(path=None, chunk_size=CHUNK_SIZE, typed=True):
+    # Arrow tables of roughly chunk_size rows, sized through the reader's block size
+    path = path or FILE_PATH
+    with open(path, "rb") as source:
+        sample = source.read(1 << 20)
+    row_bytes = max(1, len(sample) // max(1, sample.count(b"\n")))
+    read_options = pv.ReadOptions(block_size=max(1 << 16, min(chunk_size * row_bytes, 1 << 30)))
+    with pv.open_csv(path, read_options=read_options, convert_options=_convert_options(typed)) as reader:
+        for batch in reader:
+            table = pa.Table.from_batches([batch])
+            yield restore_text_nulls(table) if typed else table
+
+def load_csv_to_db(engine, path=None):
     try:
-        df = pd.read_csv(FILE_PATH)
+        df = read_deliveries_csv(path)
         logging.info(f"File loaded to Db successfully")
         
-        df.to_sql(name = TABLE_NAME , 
-                  con=engine , 
-                  schema = RAW_SCHEMA,
-                  if_exists="replace",
-                  index=False
-                  )
+        # parsed times need a TIME column, everything else maps on its own
+        sql_types = {column: Time() for column in TIME_COLUMNS} if df.attrs.get("typed_csv") else None
+        copy_dataframe(df, engine, TABLE_NAME, RAW_SCHEMA, if_exists="replace", dtype=sql_types)
         logging.info(f"Data loaded into {RAW_SCHEMA}.{TABLE_NAME} successfully")
     except Exception as e:
         logging.error("CSV load failed")
-        raise e
\ No newline at end of file
+        raise e
+
+def order_months(order_dates):
+    # partition key; rows whose date does not parse land in order_month=unknown
+    return parse_order_dates(order_dates).dt.strftime("%Y-%m").fillna(UNKNOWN_MONTH)
+
+def raw_zone_marker(raw_zone_dir=RAW_ZONE_DIR):
+    marker_path = os.path.join(raw_zone_dir, RAW_ZONE_MARKER)
+    if not os.path.exists(marker_path):
+        return None
+    with open(marker_path) as marker:
+        return json.load(marker)
+
+def land_raw_zone(fingerprint=None, chunk_size=CHUNK_SIZE, raw_zone_dir=RAW_ZONE_DIR):
+    try:
+        marker = raw_zone_marker(raw_zone_dir)
+        if fingerprint and marker and marker["source_sha256"] == fingerprint["source_sha256"]:
+            logging.info(f"Source already landed in {raw_zone_dir} - {marker['rows']} records")
+            return marker
+        
+        tmp_dir = f"{raw_zone_dir}.tmp"
+        try:
+            rows, months = _land_partitions(tmp_dir, chunk_size, typed=CSV_READER == "arrow")
+        except pa.ArrowInvalid as e:
+            if CSV_READER != "arrow":
+                raise e
+            logging.warning(f"{FILE_PATH} does not fit the declared schema, landing it as text: {e}")
+            rows, months = _land_partitions(tmp_dir, chunk_size, typed=False)
+        
+        os.makedirs(tmp_dir, exist_ok=True)
+        marker = {"source_sha256": (fingerprint or {}).get("source_sha256"), "rows": rows,
+                  "partitions": sorted(months)}
+        with open(os.path.join(tmp_dir, RAW_ZONE_MARKER), "w") as marker_file:
+            json.dump(marker, marker_file)
+        shutil.rmtree(raw_zone_dir, ignore_errors=True)
+        os.replace(tmp_dir, raw_zone_dir)
+        logging.info(f"Landed {rows} records in {len(months)} partitions under {raw_zone_dir}")
+        return marker
+    except Exception as e:
+        logging.error(f"Failed to land source in the raw zone: {e}")
+        raise e
+
+def _land_partitions(tmp_dir, chunk_size, typed):
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    rows = 0
+    months = set()
+    for i, table in enumerate(iter_csv_tables(FILE_PATH, chunk_size, typed)):
+        table_months = pa.array(order_months(table.column("Order_Date").to_pandas()), pa.string())
+        for month in pc.unique(table_months).to_pylist():
+            partition_dir = os.path.join(tmp_dir, f"order_month={month}")
+            os.makedirs(partition_dir, exist_ok=True)
+            pq.write_table(table.filter(pc.equal(table_months, month)),
+                           os.path.join(partition_dir, f"part-{i:05d}.parquet"))
+            months.add(month)
+        rows += table.num_rows
+    return rows, months
+
+def raw_zone_files(months=None, raw_zone_dir=RAW_ZONE_DIR):
+    files = sorted(glob.glob(os.path.join(raw_zone_dir, "order_month=*", "*.parquet")))
+    if months is not None:
+        wanted = {f"order_month={month}" for month in months}
+        files = [path for path in files if os.path.basename(os.path.dirname(path)) in wanted]
+    return files
+
+def iter_raw_zone(months=None, raw_zone_dir=RAW_ZONE_DIR, columns=None):
+    # memory-mapped reads, one part file per batch
+    for path in raw_zone_files(months, raw_zone_dir):
+        yield pq.read_table(path, columns=columns, memory_map=True).to_pandas()
+
+def read_raw_zone(months=None, raw_zone_dir=RAW_ZONE_DIR):
+    try:
+        tables = [pq.read_table(path, memory_map=True) for path in raw_zone_files(months, raw_zone_dir)]
+        if not tables:
+            raise FileNotFoundError(f"No landed partitions under {raw_zone_dir}")
+        df = pa.concat_tables(tables).to_pandas()
+        logging.info(f"Raw data read from {raw_zone_dir} - {len(df)} records")
+        return df
+    except Exception as e:
+        logging.error(f"Failed to read the raw zone: {e}")
+        raise e
+
+def audit_raw_zone(engine, raw_zone_dir=RAW_ZONE_DIR):
+    # copy of the landed source into raw_data.deliveries_raw, for auditing only
+    try:
+        db_schema(engine)
+        total = 0
+        for i, part in enumerate(iter_raw_zone(raw_zone_dir=raw_zone_dir)):
+            copy_dataframe(part, engine, TABLE_NAME, RAW_SCHEMA, if_exists="replace" if i == 0 else "append")
+            total += len(part)
+        logging.info(f"Raw audit copy written to {RAW_SCHEMA}.{TABLE_NAME} - {total} records")
+        return total
+    except Exception as e:
+        logging.error(f"Raw audit copy failed: {e}")
+        raise e
+
+def start_raw_audit(engine):
+    global _raw_audit
+    executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="raw_audit")
+    _raw_audit = executor.submit(audit_raw_zone, engine)
+    executor.shutdown(wait=False)
+    return _raw_audit
+
+def wait_for_raw_audit():
+    # the audit copy is optional, its failure is reported but never fails the run
+    global _raw_audit
+    if _raw_audit is None:
+        return None
+    try:
+        return _raw_audit.result()
+    except Exception as e:
+        logging.error(f"Raw audit copy did not complete: {e}")
+        return None
+    finally:
+        _raw_audit = None
@@ -0,0 +1,52 @@
+import os
+import numpy as np
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# geohash length of the dim_location grid; 6 gives cells of about 1.2 km x 0.6 km
+GEOHASH_PRECISION = int(os.getenv("ETL_GEOHASH_PRECISION", "6"))
+GEOHASH_ALPHABET = np.frombuffer(b"0123456789bcdefghjkmnpqrstuvwxyz", dtype=np.uint8)
+EARTH_RADIUS_KM = 6371.0088
+
+
+def _quantize(values, low, high, bits):
+    # index of the cell along one axis, the same halving geohash does bit by bit
+    scaled = np.floor((np.asarray(values, dtype=float) - low) / (high - low) * (1 << bits))
+    return np.clip(np.nan_to_num(scaled), 0, (1 << bits) - 1).astype(np.int64)
+
+
+def geo_cells(latitudes, longitudes, precision=GEOHASH_PRECISION):
+    # geohash of every point plus the centre of its cell; missing coordinates give None
+    bits = precision * 5
+    lon_bits = (bits + 1) // 2
+    lat_bits = bits // 2
+    lat_index = _quantize(latitudes, -90, 90, lat_bits)
+    lon_index = _quantize(longitudes, -180, 180, lon_bits)
+
+    # interleave the two indexes, longitude first
+    code = np.zeros(len(lat_index), dtype=np.int64)
+    for position in range(bits):
+        if position % 2 == 0:
+            bit = (lon_index >> (lon_bits - 1 - position // 2)) & 1
+        else:
+            bit = (lat_index >> (lat_bits - 1 - position // 2)) & 1
+        code = (code << 1) | bit
+
+    characters = np.empty((len(code), precision), dtype=np.uint8)
+    for position in range(precision):
+        characters[:, position] = GEOHASH_ALPHABET[(code >> (5 * (precision - 1 - position))) & 31]
+    cells = characters.view(f"S{precision}").ravel().astype(str).astype(object)
+
+    missing = np.isnan(np.asarray(latitudes, dtype=float)) | np.isnan(np.asarray(longitudes, dtype=float))
+    cells[missing] = None
+    centre_lat = np.where(missing, np.nan, -90 + (lat_index + 0.5) * 180 / (1 << lat_bits))
+    centre_lon = np.where(missing, np.nan, -180 + (lon_index + 0.5) * 360 / (1 << lon_bits))
+    return cells, centre_lat, centre_lon
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    lat1, lon1, lat2, lon2 = (np.radians(np.asarray(values, dtype=float))
+                              for values in (lat1, lon1, lat2, lon2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(a))
@@ -0,0 +1,129 @@
+import os
+import hashlib
+import logging
+import pandas as pd
+from sqlalchemy import text
+from dotenv import load_dotenv
+from bulk import copy_dataframe
+from extract import FILE_PATH
+
+load_dotenv()
+logging.basicConfig(level=logging.INFO , format="%(asctime)s - %(levelname)s - %(message)s")
+
+STAR_SCHEMA = "star_schema"
+STATE_TABLE = "pipeline_state"
+PIPELINE_NAME = "food_delivery_etl"
+
+# full = truncate and reload, incremental = only rows not yet in fact_deliveries
+LOAD_MODE = os.getenv("ETL_LOAD_MODE", "full").lower()
+
+# built once, so every batch reuses the engine's compiled form
+SELECT_STATE = text(f"""
+    SELECT source_sha256, source_size, source_mtime, last_order_date, rows_loaded
+    FROM {STAR_SCHEMA}.{STATE_TABLE}
+    WHERE pipeline_name = :name
+""")
+UPSERT_STATE = text(f"""
+    INSERT INTO {STAR_SCHEMA}.{STATE_TABLE}
+        (pipeline_name, source_sha256, source_size, source_mtime,
+         last_order_date, rows_loaded, updated_at)
+    VALUES (:name, :source_sha256, :source_size, :source_mtime,
+            :last_order_date, :rows_loaded, CURRENT_TIMESTAMP)
+    ON CONFLICT (pipeline_name) DO UPDATE SET
+        source_sha256 = EXCLUDED.source_sha256,
+        source_size = EXCLUDED.source_size,
+        source_mtime = EXCLUDED.source_mtime,
+        last_order_date = GREATEST({STATE_TABLE}.last_order_date, EXCLUDED.last_order_date),
+        rows_loaded = EXCLUDED.rows_loaded,
+        updated_at = EXCLUDED.updated_at
+""")
+CREATE_INCOMING_IDS = text("CREATE TEMP TABLE _incoming_ids (delivery_id VARCHAR(50))")
+SELECT_NEW_IDS = text(f"""
+    SELECT i.delivery_id
+    FROM _incoming_ids i
+    WHERE NOT EXISTS (
+        SELECT 1 FROM {STAR_SCHEMA}.fact_deliveries f
+        WHERE f.delivery_id = i.delivery_id
+    )
+""")
+DROP_INCOMING_IDS = text("DROP TABLE _incoming_ids")
+
+
+def source_fingerprint(path=None):
+    path = path or FILE_PATH
+    stat = os.stat(path)
+    digest = hashlib.sha256()
+    with open(path, "rb") as source:
+        for block in iter(lambda: source.read(1024 * 1024), b""):
+            digest.update(block)
+    return {
+        "source_sha256": digest.hexdigest(),
+        "source_size": stat.st_size,
+        "source_mtime": stat.st_mtime
+    }
+
+
+def get_pipeline_state(engine):
+    try:
+        with engine.connect() as conn:
+            row = conn.execute(SELECT_STATE, {"name": PIPELINE_NAME}).fetchone()
+        return dict(row._mapping) if row else None
+
+    except Exception as e:
+        logging.error(f"Failed to read pipeline state: {e}")
+        raise e
+
+
+def save_pipeline_state(engine, fingerprint, last_order_date, rows_loaded):
+    try:
+        with engine.begin() as conn:
+            conn.execute(UPSERT_STATE, {"name": PIPELINE_NAME, "last_order_date": last_order_date,
+                   "rows_loaded": rows_loaded, **fingerprint})
+        logging.info(f"Pipeline state saved: high-water mark {last_order_date}, {rows_loaded} rows loaded")
+
+    except Exception as e:
+        logging.error(f"Failed to save pipeline state: {e}")
+        raise e
+
+
+def source_changed(engine, path=None):
+    path = path or FILE_PATH
+    state = get_pipeline_state(engine)
+    if state is None:
+        return True
+
+    stat = os.stat(path)
+    if stat.st_size == state["source_size"] and stat.st_mtime == state["source_mtime"]:
+        return False
+    # touched but not modified still counts as unchanged
+    return source_fingerprint(path)["source_sha256"] != state["source_sha256"]
+
+
+def filter_new_deliveries(df, engine):
+    try:
+        state = get_pipeline_state(engine)
+        initial_rows_count = len(df)
+
+        if df.empty:
+            return df
+
+        # every id is anti-joined whatever its date, so late deliveries are not lost;
+        # the temp table is dropped explicitly, DuckDB has no ON COMMIT DROP
+        with engine.begin() as conn:
+            conn.execute(CREATE_INCOMING_IDS)
+            copy_dataframe(df[["ID"]].rename(columns={"ID": "delivery_id"}), conn,
+                           "_incoming_ids", None)
+            new_ids = conn.execute(SELECT_NEW_IDS).scalars().all()
+            conn.execute(DROP_INCOMING_IDS)
+
+        df = df[df["ID"].isin(new_ids)]
+        logging.info(f"{len(df)} new deliveries out of {initial_rows_count} cleaned records")
+        if state and state["last_order_date"] is not None:
+            late = int((df["Order_Date"] < pd.Timestamp(state["last_order_date"])).sum())
+            if late:
+                logging.info(f"{late} new deliveries are dated before the high-water mark {state['last_order_date']}")
+        return df
+
+    except Exception as e:
+        logging.error(f"Failed to filter new deliveries: {e}")
+        raise e
@@ -0,0 +1,163 @@
+import os
+import logging
+from datetime import date, datetime
+import numpy as np
+import pandas as pd
+from sqlalchemy import text
+from dotenv import load_dotenv
+from bulk import copy_dataframe
+
+load_dotenv()
+logging.basicConfig(level=logging.INFO , format="%(asctime)s - %(levelname)s - %(message)s")
+
+STAR_SCHEMA = "star_schema"
+# serial = database-assigned keys looked up after the dimensions are written,
+# hash = keys computed from the natural key, so facts need no lookups
+KEY_MODE = os.getenv("ETL_KEY_MODE", "serial").lower()
+
+# surrogate key and natural key of every dimension; the natural key columns
+# are hashed in this order, so changing it changes every key
+DIMENSION_NATURAL_KEYS = {
+    'dim_delivery_person': ('delivery_person_key', ['delivery_person_id']),
+    'dim_location': ('location_key', ['geo_cell', 'city', 'location_type']),
+    'dim_datetime': ('datetime_key', ['order_date', 'time_ordered', 'time_picked']),
+    'dim_vehicle': ('vehicle_key', ['vehicle_condition', 'vehicle_type'])
+}
+# fact_deliveries columns holding each dimension's key
+FACT_KEY_COLUMNS = {
+    'dim_delivery_person': ['delivery_person_key'],
+    'dim_location': ['restaurant_location_key', 'delivery_location_key'],
+    'dim_datetime': ['datetime_key'],
+    'dim_vehicle': ['vehicle_key']
+}
+HASH_MULTIPLIER = np.uint64(1099511628211)
+# keys stay positive BIGINTs
+HASH_MASK = np.uint64(0x7FFFFFFFFFFFFFFF)
+
+
+def _canonical(value):
+    # one text form per value, whether it came from a cleaned frame or from the database
+    if isinstance(value, datetime):
+        return value.date().isoformat()
+    if isinstance(value, date):
+        return value.isoformat()
+    if isinstance(value, (int, float, np.integer, np.floating)) and not isinstance(value, bool):
+        return str(int(value))
+    return str(value)
+
+
+def natural_key_hashes(frame, table):
+    # a stable 63-bit key per row from the dimension's natural key columns;
+    # each column is hashed once per distinct value, rows with a missing part get no key
+    _, natural_key = DIMENSION_NATURAL_KEYS[table]
+    combined = np.zeros(len(frame), dtype=np.uint64)
+    complete = np.ones(len(frame), dtype=bool)
+    for column in natural_key:
+        codes, uniques = pd.factorize(frame[column])
+        canonical = np.array([_canonical(value) for value in uniques], dtype=object)
+        # the extra slot is what missing values (code -1) pick up
+        hashes = np.append(pd.util.hash_array(canonical, categorize=False), np.uint64(0))
+        complete &= codes >= 0
+        combined = combined * HASH_MULTIPLIER + hashes[codes]
+    keys = pd.Series((combined & HASH_MASK).astype(np.int64), index=frame.index, dtype="Int64")
+    return keys.where(complete)
+
+
+def check_key_collisions(frame, keys, table):
+    # two natural keys sharing one hash would merge two dimension members
+    _, natural_key = DIMENSION_NATURAL_KEYS[table]
+    members = frame[natural_key].drop_duplicates()
+    if keys.nunique() == len(members):
+        return
+    members = frame[natural_key].assign(_key=keys.to_numpy()).drop_duplicates()
+    collisions = members[members['_key'].duplicated(keep=False)]
+    if len(collisions):
+        raise ValueError(f"{len(collisions)} natural keys of {table} share a hash key: "
+                         f"{collisions.head().to_dict('records')}")
+
+
+def assign_hash_keys(frame, table):
+    # the dimension rows with their key in front; rows without a complete natural key are left out
+    key_column, _ = DIMENSION_NATURAL_KEYS[table]
+    keys = natural_key_hashes(frame, table)
+    if keys.isna().any():
+        logging.warning(f"{int(keys.isna().sum())} {table} rows have an incomplete natural key and get no key")
+        frame, keys = frame[keys.notna()], keys[keys.notna()]
+    check_key_collisions(frame, keys, table)
+    return frame.assign(**{key_column: keys.astype(np.int64)})[[key_column, *frame.columns]]
+
+
+def warehouse_key_mode(conn):
+    # hash keys are BIGINT without a sequence, serial keys INTEGER
+    data_type = conn.execute(text(f"""
+        SELECT data_type FROM information_schema.columns
+        WHERE table_schema = '{STAR_SCHEMA}' AND table_name = 'dim_delivery_person'
+          AND column_name = 'delivery_person_key'
+    """)).scalar()
+    return "hash" if data_type and data_type.lower() == "bigint" else "serial"
+
+
+def check_key_mode(conn):
+    mode = warehouse_key_mode(conn)
+    if mode != KEY_MODE:
+        raise ValueError(f"star_schema uses {mode} keys but ETL_KEY_MODE is {KEY_MODE}; "
+                         f"rebuild the warehouse or set ETL_KEY_MODE={mode}")
+
+
+def migrate_to_hash_keys(conn):
+    # rewrites a SERIAL-keyed star schema in place: keys become BIGINT hashes of
+    # the natural keys and the facts follow through a key map, in the caller's transaction
+    if warehouse_key_mode(conn) == "hash":
+        return
+    logging.info("Migrating star_schema dimensions from SERIAL to hash keys")
+
+    # the foreign keys are put back once both sides hold the new keys
+    foreign_keys = conn.execute(text(f"""
+        SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint
+        WHERE conrelid = '{STAR_SCHEMA}.fact_deliveries'::regclass AND contype = 'f'
+    """)).fetchall()
+    for name, _ in foreign_keys:
+        conn.execute(text(f"ALTER TABLE {STAR_SCHEMA}.fact_deliveries DROP CONSTRAINT {name}"))
+
+    for table, (key_column, natural_key) in DIMENSION_NATURAL_KEYS.items():
+        sequence = conn.execute(text("SELECT pg_get_serial_sequence(:table, :column)"),
+                                {"table": f"{STAR_SCHEMA}.{table}", "column": key_column}).scalar()
+        conn.execute(text(f"""
+            ALTER TABLE {STAR_SCHEMA}.{table}
+                ALTER COLUMN {key_column} TYPE BIGINT,
+                ALTER COLUMN {key_column} DROP DEFAULT
+        """))
+        if sequence:
+            conn.execute(text(f"DROP SEQUENCE {sequence}"))
+        for fact_column in FACT_KEY_COLUMNS[table]:
+            conn.execute(text(f"ALTER TABLE {STAR_SCHEMA}.fact_deliveries ALTER COLUMN {fact_column} TYPE BIGINT"))
+
+        members = pd.read_sql(text(f"SELECT {key_column}, {', '.join(natural_key)} FROM {STAR_SCHEMA}.{table}"),
+                              conn)
+        if members.empty:
+            continue
+        keys = natural_key_hashes(members, table)
+        complete = keys.notna()
+        check_key_collisions(members[complete], keys[complete], table)
+        # rows without a complete natural key keep their old key, negated so no hash can take it
+        key_map = pd.DataFrame({
+            "old_key": members[key_column].astype(np.int64),
+            "new_key": keys.fillna(-members[key_column]).astype(np.int64)
+        })
+        conn.execute(text("CREATE TEMP TABLE _key_map (old_key BIGINT PRIMARY KEY, new_key BIGINT)"))
+        copy_dataframe(key_map, conn, "_key_map", None)
+        conn.execute(text(f"""
+            UPDATE {STAR_SCHEMA}.{table} d SET {key_column} = m.new_key
+            FROM _key_map m WHERE d.{key_column} = m.old_key
+        """))
+        for fact_column in FACT_KEY_COLUMNS[table]:
+            conn.execute(text(f"""
+                UPDATE {STAR_SCHEMA}.fact_deliveries f SET {fact_column} = m.new_key
+                FROM _key_map m WHERE f.{fact_column} = m.old_key
+            """))
+        conn.execute(text("DROP TABLE _key_map"))
+        logging.info(f"{table}: {int(complete.sum())} hash keys, {int((~complete).sum())} kept negated")
+
+    for name, definition in foreign_keys:
+        conn.execute(text(f"ALTER TABLE {STAR_SCHEMA}.fact_deliveries ADD CONSTRAINT {name} {definition}"))
+    logging.info("star_schema migrated to hash keys")
@@ -1,260 +1,516 @@
 import os 
+import time
 import pandas as pd 
 import numpy as np
 import logging
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
 from sqlalchemy import create_engine , text
 from dotenv import load_dotenv
+from bulk import upsert_dataframe, transaction_scope, affected_rows
+from transform import ensure_fact_partitions
+from metrics import tracked, track
+from geo import geo_cells, haversine_km
+from keys import KEY_MODE, assign_hash_keys, natural_key_hashes
 
 load_dotenv()
 logging.basicConfig(level=logging.INFO , format="%(asctime)s - %(levelname)s - %(message)s")
 
 TABLE_NAME= "deliveries_raw"
-FILE_PATH = "data/source/Deliveries.csv"
 SQL_CONN = os.getenv("AIRFLOW__DATABASE__SQL_ALCHEMY_CONN")
 STAR_SCHEMA = "star_schema"
 RAW_SCHEMA ="raw_data"
 
 
+def build_dim_delivery_person(df):
+    #extract delivery people 
+    delivery_people = df[["Delivery_person_ID" , "Delivery_person_Age" ,"Delivery_person_Ratings"]].copy()
+    
+    delivery_people = delivery_people.drop_duplicates(subset=['Delivery_person_ID'], keep='first')
+    
+    return delivery_people.rename(
+        columns={
+            'Delivery_person_ID' : 'delivery_person_id',
+            'Delivery_person_Age' : 'age',
+            'Delivery_person_Ratings' : "ratings"
+        })
+
+
+def build_dim_location(df):
+    # one row per geohash cell, city and location type; restaurant and delivery
+    # points are interleaved row by row, so keys are handed out in source order
+    rows = len(df)
+    cells, latitudes, longitudes = geo_cells(
+        np.column_stack([df['Restaurant_latitude'].to_numpy(dtype=float),
+                         df['Delivery_location_latitude'].to_numpy(dtype=float)]).ravel(),
+        np.column_stack([df['Restaurant_longitude'].to_numpy(dtype=float),
+                         df['Delivery_location_longitude'].to_numpy(dtype=float)]).ravel())
+    locations = pd.DataFrame({
+        'geo_cell': cells,
+        'latitude': latitudes,
+        'longitude': longitudes,
+        'city': np.repeat(df['City'].to_numpy(), 2),
+        'location_type': np.tile(['restaurant', 'delivery'], rows)
+    })
+    return locations.drop_duplicates(subset=['geo_cell', 'city', 'location_type'])
+
+
+def build_dim_datetime(df):
+    # Get unique combinations of date and times
+    datetimes = df[['Order_Date', 'Time_Orderd', 'Time_Order_picked']].drop_duplicates()
+    order_date = datetimes['Order_Date']
+    
+    return pd.DataFrame({
+        'order_date': order_date.dt.normalize(),
+        'time_ordered': datetimes['Time_Orderd'],
+        'time_picked': datetimes['Time_Order_picked'],
+        'day': order_date.dt.day,
+        'month': order_date.dt.month,
+        'year': order_date.dt.year
+    })
+
+
+def build_dim_vehicle(df):
+    vehicles = df[['Vehicle_condition', 'Type_of_vehicle']].drop_duplicates()
+    
+    return vehicles.rename(columns={
+        'Vehicle_condition': 'vehicle_condition',
+        'Type_of_vehicle': 'vehicle_type'
+    })
+
+
+# dimension builders are independent of each other, only the fact load needs them all
+DIMENSION_BUILDERS = {
+    'dim_delivery_person': build_dim_delivery_person,
+    'dim_location': build_dim_location,
+    'dim_datetime': build_dim_datetime,
+    'dim_vehicle': build_dim_vehicle
+}
+DIMENSION_UPSERTS = {
+    # latest age/ratings win for people already in the dimension
+    'dim_delivery_person': {'conflict_columns': ['delivery_person_id'], 'update_columns': ['age', 'ratings']},
+    'dim_location': {'conflict_columns': ['geo_cell', 'city', 'location_type']},
+    'dim_datetime': {'conflict_columns': ['order_date', 'time_ordered', 'time_picked']},
+    'dim_vehicle': {'conflict_columns': ['vehicle_condition', 'vehicle_type']}
+}
+
+
+def prepare_dimension(table, df):
+    frame = DIMENSION_BUILDERS[table](df)
+    if KEY_MODE == "hash":
+        frame = assign_hash_keys(frame, table)
+    return frame
+
+
+def write_dimension(table, frame, engine):
+    return upsert_dataframe(frame, engine, table, STAR_SCHEMA, serialize=True, **DIMENSION_UPSERTS[table])
+
+
+@tracked()
 def populate_dim_delivery_person(df ,engine):
     try:
-        #extract delivery people 
-        delivery_people = df[["Delivery_person_ID" , "Delivery_person_Age" ,"Delivery_person_Ratings"]].copy()
-        
-        delivery_people = delivery_people.drop_duplicates(subset=['Delivery_person_ID'], keep='first')
-        
-        delivery_people = delivery_people.rename(
-            columns={
-                'Delivery_person_ID' : 'delivery_person_id',
-                'Delivery_person_Age' : 'age',
-                'Delivery_person_Ratings' : "ratings"
-            })
+        written = write_dimension('dim_delivery_person', prepare_dimension('dim_delivery_person', df), engine)
         
-        delivery_people.to_sql(
-            name='dim_delivery_person',
-            con=engine,
-            schema = STAR_SCHEMA,
-            if_exists='append',
-            index=False
-        )
-        
-        logging.info(f"Inserted {len(delivery_people)} records into dim_delivery_person")
+        logging.info(f"Upserted {written} records into dim_delivery_person")
+        return written
         
     except Exception as e:
         logging.error(f"FAILED TO INSERT RECORDS TO dim_delivery_person : {e}")
         raise e
 
 
+@tracked()
 def populate_dim_location(df ,engine):
     try:
-        locations =[]
-        
-        
-        for _ , row in df.iterrows():
-            #restaurant locations
-            locations.append({
-                "latitude" : row['Restaurant_latitude'],
-                "longitude":row['Restaurant_longitude'],
-                "city":row['City'],
-                "location_type" : "restaurant"
-            })
-            
-            #delivery locations
-            locations.append({
-                'latitude': row['Delivery_location_latitude'],
-                'longitude':row['Delivery_location_longitude'],
-                'city': row['City'],
-                'location_type': 'delivery'
-            })
+        written = write_dimension('dim_location', prepare_dimension('dim_location', df), engine)
             
-        locations = pd.DataFrame(locations).drop_duplicates()
-            
-        locations.to_sql(
-                name ='dim_location',
-                con=engine,
-                schema = STAR_SCHEMA,
-                if_exists=  'append',
-                index =False
-            )
-            
-        logging.info(f"Inserted {len(locations)} records into dim_location")
-        
+        logging.info(f"Inserted {written} new records into dim_location")
+        return written
     
     except Exception as e:
         logging.error(f"Failed to insert records to dim_location : {e}")
         raise e
 
+
+@tracked()
 def populate_dim_datetime(df, engine):
     try:
-        # Get unique combinations of date and times
-        datetimes = df[['Order_Date', 'Time_Orderd', 'Time_Order_picked']].drop_duplicates()
-        
-        datetime_records = []
-        for _, row in datetimes.iterrows():
-            datetime_records.append({
-                'order_date': row['Order_Date'].date(),
-                'time_ordered': row['Time_Orderd'],
-                'time_picked': row['Time_Order_picked'],
-                'day': row['Order_Date'].day,
-                'month': row['Order_Date'].month,
-                'year': row['Order_Date'].year
-            })
+        datetime_df = prepare_dimension('dim_datetime', df)
+        written = write_dimension('dim_datetime', datetime_df, engine)
         
-        datetime_df = pd.DataFrame(datetime_records)
-        
-        
-        with engine.connect() as conn:
-            transaction = conn.begin()
-            try:
-                for _, row in datetime_df.iterrows():
-                    insert_query = text("""
-                        INSERT INTO star_schema.dim_datetime (order_date, time_ordered, time_picked, day, month, year)
-                        VALUES (:order_date, :time_ordered, :time_picked, :day, :month, :year)
-                        ON CONFLICT (order_date, time_ordered, time_picked) DO NOTHING
-                    """)
-                    conn.execute(insert_query, {
-                        'order_date': row['order_date'],
-                        'time_ordered': row['time_ordered'],
-                        'time_picked': row['time_picked'],
-                        'day': row['day'],
-                        'month': row['month'],
-                        'year': row['year']
-                    })
-                transaction.commit()
-                logging.info(f"Processed {len(datetime_df)} unique datetime combinations for dim_datetime")
-                
-            except Exception as e:
-                transaction.rollback()
-                raise e
+        logging.info(f"Processed {len(datetime_df)} unique datetime combinations for dim_datetime")
+        return written
         
     except Exception as e:
         logging.error(f"Failed to populate dim_datetime: {e}")
         raise e
 
 
+@tracked()
 def populate_dim_vehicle(df, engine):
     try:
+        written = write_dimension('dim_vehicle', prepare_dimension('dim_vehicle', df), engine)
         
-        vehicles = df[['Vehicle_condition', 'Type_of_vehicle']].drop_duplicates()
-        
-        vehicles = vehicles.rename(columns={
-            'Vehicle_condition': 'vehicle_condition',
-            'Type_of_vehicle': 'vehicle_type'
-        })
-        
-        vehicles.to_sql(
-            name='dim_vehicle',
-            con=engine,
-            schema=STAR_SCHEMA,
-            if_exists='append',
-            index=False
-        )
-        
-        logging.info(f"Inserted {len(vehicles)} vehicles into dim_vehicle")
+        logging.info(f"Inserted {written} new vehicles into dim_vehicle")
+        return written
         
     except Exception as e:
         logging.error(f"Failed to populate dim_vehicle: {e}")
         raise e
 
-def populate_fact_deliveries(df ,engine):
+# natural key -> surrogate key mappings, read once per fact load
+DIMENSION_KEY_QUERIES = {
+    'delivery_person': f"""
+        SELECT delivery_person_key, delivery_person_id
+        FROM {STAR_SCHEMA}.dim_delivery_person
+    """,
+    'location': f"""
+        SELECT location_key, geo_cell, city, location_type
+        FROM {STAR_SCHEMA}.dim_location
+        WHERE geo_cell IS NOT NULL
+    """,
+    'vehicle': f"""
+        SELECT vehicle_key, vehicle_condition, vehicle_type
+        FROM {STAR_SCHEMA}.dim_vehicle
+    """,
+    'datetime': f"""
+        SELECT datetime_key, order_date, time_ordered, time_picked
+        FROM {STAR_SCHEMA}.dim_datetime
+    """
+}
+DIMENSION_KEY_COLUMNS = {
+    'delivery_person': 'delivery_person_key',
+    'location': 'location_key',
+    'vehicle': 'vehicle_key',
+    'datetime': 'datetime_key'
+}
+# the same reads limited to keys above :after, run for every pipelined batch
+NEW_DIMENSION_KEY_QUERIES = {
+    name: text(f"SELECT * FROM ({query}) keys WHERE {DIMENSION_KEY_COLUMNS[name]} > :after")
+    for name, query in DIMENSION_KEY_QUERIES.items()
+}
+
+def fetch_dimension_keys(engine):
+    try:
+        with engine.connect() as conn:
+            dimension_keys = {
+                name: pd.read_sql(text(query), conn)
+                for name, query in DIMENSION_KEY_QUERIES.items()
+            }
+        for name, keys in dimension_keys.items():
+            logging.info(f"Fetched {len(keys)} {name} keys")
+        return dimension_keys
+
+    except Exception as e:
+        logging.error(f"Failed to fetch dimension keys: {e}")
+        raise e
+
+
+def fetch_new_dimension_keys(engine, dimension_keys=None):
+    # surrogate keys only grow, so a key cache is brought up to date by
+    # reading the rows above the highest key it already holds
+    if dimension_keys is None:
+        return fetch_dimension_keys(engine)
+    try:
+        refreshed = {}
+        with engine.connect() as conn:
+            for name, query in NEW_DIMENSION_KEY_QUERIES.items():
+                key_column = DIMENSION_KEY_COLUMNS[name]
+                known = dimension_keys[name]
+                after = int(known[key_column].max()) if len(known) else 0
+                new_keys = pd.read_sql(query, conn, params={"after": after})
+                refreshed[name] = pd.concat([known, new_keys], ignore_index=True) if len(new_keys) else known
+        return refreshed
+
+    except Exception as e:
+        logging.error(f"Failed to fetch new dimension keys: {e}")
+        raise e
+
+
+def _attach_key(facts, keys, left_on, right_on, key_column, unmatched):
+    # one key per natural key, lowest surrogate wins like the old fetchone()
+    keys = keys.sort_values(key_column).drop_duplicates(subset=right_on, keep='first')
+    keys = keys[right_on + [key_column]]
+    if key_column in facts.columns:
+        facts = facts.drop(columns=key_column)
+
+    facts = facts.merge(keys, how='left', left_on=left_on, right_on=right_on,
+                        suffixes=('', '_dim'))
+    facts = facts.drop(columns=[c for c in right_on if c not in left_on])
+    facts[key_column] = facts[key_column].astype('Int64')
+    unmatched[key_column] = int(facts[key_column].isna().sum())
+    return facts
+
+
+def hash_surrogate_keys(df):
+    # the same hashes the dimension builders write, computed from the fact rows
+    # alone; facts whose natural key is incomplete get no key, like a failed lookup
+    facts = df.reset_index(drop=True)
+    restaurant_cells, _, _ = geo_cells(facts['Restaurant_latitude'], facts['Restaurant_longitude'])
+    delivery_cells, _, _ = geo_cells(facts['Delivery_location_latitude'], facts['Delivery_location_longitude'])
+    natural_keys = {
+        'delivery_person_key': ('dim_delivery_person', {'delivery_person_id': facts['Delivery_person_ID']}),
+        'restaurant_location_key': ('dim_location', {'geo_cell': restaurant_cells, 'city': facts['City'],
+                                                     'location_type': 'restaurant'}),
+        'delivery_location_key': ('dim_location', {'geo_cell': delivery_cells, 'city': facts['City'],
+                                                   'location_type': 'delivery'}),
+        'vehicle_key': ('dim_vehicle', {'vehicle_condition': facts['Vehicle_condition'],
+                                        'vehicle_type': facts['Type_of_vehicle']}),
+        'datetime_key': ('dim_datetime', {'order_date': pd.to_datetime(facts['Order_Date']).dt.normalize(),
+                                          'time_ordered': facts['Time_Orderd'],
+                                          'time_picked': facts['Time_Order_picked']})
+    }
+    unmatched = {}
+    for key_column, (table, columns) in natural_keys.items():
+        facts[key_column] = natural_key_hashes(pd.DataFrame(columns, index=facts.index), table)
+        unmatched[key_column] = int(facts[key_column].isna().sum())
+
+    for key_column, count in unmatched.items():
+        if count:
+            logging.warning(f"{count} fact rows have no {key_column}")
+
+    return facts, unmatched
+
+
+def resolve_surrogate_keys(df, engine, dimension_keys=None):
+    if KEY_MODE == "hash":
+        return hash_surrogate_keys(df)
+    if dimension_keys is None:
+        dimension_keys = fetch_dimension_keys(engine)
+
+    unmatched = {}
+    facts = df.reset_index(drop=True)
+    restaurant_cells, _, _ = geo_cells(facts['Restaurant_latitude'], facts['Restaurant_longitude'])
+    delivery_cells, _, _ = geo_cells(facts['Delivery_location_latitude'], facts['Delivery_location_longitude'])
+    facts = facts.assign(
+        _order_date=pd.to_datetime(facts['Order_Date']).dt.normalize(),
+        _restaurant_cell=restaurant_cells,
+        _delivery_cell=delivery_cells
+    )
+
+    #delivery person keys
+    facts = _attach_key(facts, dimension_keys['delivery_person'],
+                        ['Delivery_person_ID'], ['delivery_person_id'],
+                        'delivery_person_key', unmatched)
+
+    #restaurant and delivery location keys, looked up on the geohash cell
+    locations = dimension_keys['location']
+    for location_type, prefix, key_column in [('restaurant', '_restaurant', 'restaurant_location_key'),
+                                              ('delivery', '_delivery', 'delivery_location_key')]:
+        typed = locations[locations['location_type'] == location_type]
+        typed = typed.rename(columns={'location_key': key_column})
+        facts = _attach_key(facts, typed,
+                            [f'{prefix}_cell', 'City'],
+                            ['geo_cell', 'city'],
+                            key_column, unmatched)
+
+    #vehicle keys
+    vehicles = dimension_keys['vehicle'].copy()
+    vehicles['vehicle_condition'] = vehicles['vehicle_condition'].astype('int64')
+    facts = _attach_key(facts, vehicles,
+                        ['Vehicle_condition', 'Type_of_vehicle'],
+                        ['vehicle_condition', 'vehicle_type'],
+                        'vehicle_key', unmatched)
+
+    #datetime keys
+    datetimes = dimension_keys['datetime'].copy()
+    datetimes['order_date'] = pd.to_datetime(datetimes['order_date'])
+    facts = _attach_key(facts, datetimes,
+                        ['_order_date', 'Time_Orderd', 'Time_Order_picked'],
+                        ['order_date', 'time_ordered', 'time_picked'],
+                        'datetime_key', unmatched)
+
+    facts = facts.drop(columns=['_order_date', '_restaurant_cell', '_delivery_cell'])
+
+    for key_column, count in unmatched.items():
+        if count:
+            logging.warning(f"{count} fact rows have no matching {key_column}")
+
+    return facts, unmatched
+
+
+def build_fact_frame(facts):
+    facts = facts.assign(
+        order_date=pd.to_datetime(facts['Order_Date']).dt.normalize(),
+        distance_km=haversine_km(facts['Restaurant_latitude'], facts['Restaurant_longitude'],
+                                 facts['Delivery_location_latitude'],
+                                 facts['Delivery_location_longitude']).round(3))
+    fact_df = facts[['ID', 'order_date', 'delivery_person_key', 'restaurant_location_key',
+                     'delivery_location_key', 'vehicle_key', 'datetime_key',
+                     'Type_of_order', 'Weather_conditions', 'Road_traffic_density',
+                     'Festival', 'multiple_deliveries', 'Time_taken (min)', 'distance_km']]
+    fact_df = fact_df.rename(columns={
+        'ID': 'delivery_id',
+        'Type_of_order': 'order_type',
+        'Weather_conditions': 'weather_condition',
+        'Road_traffic_density': 'road_traffic_density',
+        'Festival': 'festival',
+        'Time_taken (min)': 'time_taken'
+    })
+
+    # COPY does not cast 24.0 into an INTEGER column the way INSERT did
+    return fact_df.assign(time_taken=fact_df['time_taken'].round().astype('Int64'))
+
+
+def write_fact_deliveries(fact_df, engine):
+    # monthly partitions are attached as new order dates arrive
+    ensure_fact_partitions(engine, fact_df['order_date'])
+
+    # facts already in the warehouse are skipped on their delivery_id
+    return upsert_dataframe(fact_df, engine, 'fact_deliveries', STAR_SCHEMA,
+                            conflict_columns=['delivery_id', 'order_date'])
+
+
+def prepare_facts(df, engine, dimension_keys=None):
+    facts, unmatched = resolve_surrogate_keys(df, engine, dimension_keys)
+    return build_fact_frame(facts), unmatched
+
+
+@tracked()
+def populate_fact_deliveries(df ,engine, prepared=None):
+    # prepared is prepare_facts' result when the caller built the frame ahead of time
     try:
         logging.info("Fact table")
-        
-        fact_records=[]
-        
-        with engine.connect() as conn :
-            for _ , row in df.iterrows():
-                #delivery person keys
-                delivery_person_query = text(f""" 
-                        SELECT delivery_person_key
-                        FROM {STAR_SCHEMA}.dim_delivery_person
-                        WHERE delivery_person_id = :person_id
-                """)
-                delivery_person_res =conn.execute(delivery_person_query,
-                                  {'person_id': row['Delivery_person_ID']}).fetchone()
-                delivery_person_key = delivery_person_res[0] if delivery_person_res else None
-                
-                #restaurant keys
-                restaurant_location_query = text(f"""
-                    SELECT location_key 
-                    FROM {STAR_SCHEMA}.dim_location 
-                    WHERE latitude = :lat AND longitude = :long 
-                    AND city = :city AND location_type = 'restaurant'
-                """)
-                restaurant_res = conn.execute(restaurant_location_query, {
-                    'lat': row['Restaurant_latitude'],
-                    'long': row['Restaurant_longitude'],
-                    'city': row['City']
-                }).fetchone()
-                restaurant_location_key = restaurant_res[0] if restaurant_res else None
-                
-                # delivery location keys
-                delivery_location_query = text(f"""
-                    SELECT location_key 
-                    FROM {STAR_SCHEMA}.dim_location 
-                    WHERE latitude = :lat AND longitude = :long 
-                    AND city = :city AND location_type = 'delivery'
-                """)
-                delivery_res = conn.execute(delivery_location_query, {
-                    'lat': row['Delivery_location_latitude'],
-                    'long': row['Delivery_location_longitude'],
-                    'city': row['City']
-                }).fetchone()
-                delivery_location_key = delivery_res[0] if delivery_res else None
-                
-                #vehicles key
-                vehicle_query = text(f"""
-                    SELECT vehicle_key 
-                    FROM {STAR_SCHEMA}.dim_vehicle 
-                    WHERE vehicle_condition = :condition AND vehicle_type = :type
-                """)
-                vehicle_res = conn.execute(vehicle_query, {
-                    'condition': row['Vehicle_condition'],
-                    'type': row['Type_of_vehicle']
-                }).fetchone()
-                vehicle_key = vehicle_res[0] if vehicle_res else None
-                
-                #datetime keys
-                datetime_query = text(f"""
-                    SELECT datetime_key 
-                    FROM {STAR_SCHEMA}.dim_datetime 
-                    WHERE order_date = :date AND time_ordered = :time_ordered AND time_picked = :time_picked
-                """)
-                datetime_res = conn.execute(datetime_query, {
-                    'date': row['Order_Date'].date(),
-                    'time_ordered': row['Time_Orderd'],
-                    'time_picked': row['Time_Order_picked']
-                }).fetchone()
-                datetime_key = datetime_res[0] if datetime_res else None
-                
-                fact_record = {
-                    'delivery_id': row['ID'],
-                    'delivery_person_key': delivery_person_key,
-                    'restaurant_location_key': restaurant_location_key,
-                    'delivery_location_key': delivery_location_key,
-                    'vehicle_key': vehicle_key,
-                    'datetime_key': datetime_key,
-                    'order_type': row['Type_of_order'],
-                    'weather_condition': row['Weather_conditions'],
-                    'road_traffic_density': row['Road_traffic_density'],
-                    'festival': row['Festival'],
-                    'multiple_deliveries': row['multiple_deliveries'],
-                    'time_taken': row['Time_taken (min)']
-                }
-                
-                fact_records.append(fact_record)
-        
-        fact_df = pd.DataFrame(fact_records)
-        
-        fact_df.to_sql(
-            name='fact_deliveries',
-            con=engine,
-            schema=STAR_SCHEMA,
-            if_exists='append',
-            index=False
-        )
-        
-        logging.info(f"Inserted {len(fact_df)} records into fact_deliveries")
+
+        fact_df, unmatched = prepared or prepare_facts(df, engine)
+        written = write_fact_deliveries(fact_df, engine)
+
+        logging.info(f"Inserted {written} new records into fact_deliveries")
+        logging.info(f"Unmatched dimension keys: {unmatched}")
+        return written
 
     except Exception as e:
         logging.error(f"Failed to insert records to fact_deliveries: {e}")
-        raise e
\ No newline at end of file
+        raise e
+
+
+
+# facts above the stored watermark are folded into the daily aggregate, so
+# each fact is counted once however many runs it takes to load them
+AGGREGATE_NAME = "agg_daily_delivery_stats"
+AGGREGATE_WATERMARK = f"""
+    SELECT last_fact_key FROM {STAR_SCHEMA}.agg_refresh_state
+    WHERE aggregate_name = :name
+"""
+SELECT_AGGREGATE_WATERMARK = text(AGGREGATE_WATERMARK)
+# DuckDB has a single writer per file, only Postgres needs the row lock
+LOCK_AGGREGATE_WATERMARK = text(AGGREGATE_WATERMARK + " FOR UPDATE")
+MAX_FACT_KEY = text(f"SELECT COALESCE(MAX(fact_key), 0) FROM {STAR_SCHEMA}.fact_deliveries")
+FOLD_INTO_AGGREGATE = text(f"""
+    INSERT INTO {STAR_SCHEMA}.{AGGREGATE_NAME} AS agg
+        (order_date, city, weather_condition, road_traffic_density, vehicle_type,
+         deliveries, time_taken_count, time_taken_sum, time_taken_min, time_taken_max)
+    SELECT f.order_date,
+           COALESCE(l.city, 'Unknown'),
+           COALESCE(f.weather_condition, 'Unknown'),
+           COALESCE(f.road_traffic_density, 'Unknown'),
+           COALESCE(v.vehicle_type, 'Unknown'),
+           COUNT(*), COUNT(f.time_taken), SUM(f.time_taken), MIN(f.time_taken), MAX(f.time_taken)
+    FROM {STAR_SCHEMA}.fact_deliveries f
+    LEFT JOIN {STAR_SCHEMA}.dim_location l ON l.location_key = f.restaurant_location_key
+    LEFT JOIN {STAR_SCHEMA}.dim_vehicle v ON v.vehicle_key = f.vehicle_key
+    WHERE f.fact_key > :watermark AND f.fact_key <= :new_watermark
+    GROUP BY 1, 2, 3, 4, 5
+    ON CONFLICT (order_date, city, weather_condition, road_traffic_density, vehicle_type)
+    DO UPDATE SET
+        deliveries = agg.deliveries + EXCLUDED.deliveries,
+        time_taken_count = agg.time_taken_count + EXCLUDED.time_taken_count,
+        time_taken_sum = COALESCE(agg.time_taken_sum, 0) + COALESCE(EXCLUDED.time_taken_sum, 0),
+        time_taken_min = LEAST(agg.time_taken_min, EXCLUDED.time_taken_min),
+        time_taken_max = GREATEST(agg.time_taken_max, EXCLUDED.time_taken_max)
+""")
+SAVE_AGGREGATE_WATERMARK = text(f"""
+    INSERT INTO {STAR_SCHEMA}.agg_refresh_state (aggregate_name, last_fact_key, refreshed_at)
+    VALUES (:name, :last_fact_key, CURRENT_TIMESTAMP)
+    ON CONFLICT (aggregate_name) DO UPDATE SET
+        last_fact_key = EXCLUDED.last_fact_key,
+        refreshed_at = EXCLUDED.refreshed_at
+""")
+
+@tracked()
+def refresh_delivery_aggregates(engine):
+    # engine may be a connection, then the fold joins the caller's transaction
+    try:
+        with transaction_scope(engine) as conn:
+            select_watermark = (LOCK_AGGREGATE_WATERMARK if engine.dialect.name == "postgresql"
+                                else SELECT_AGGREGATE_WATERMARK)
+            watermark = conn.execute(select_watermark, {"name": AGGREGATE_NAME}).scalar() or 0
+            new_watermark = conn.execute(MAX_FACT_KEY).scalar()
+            if new_watermark <= watermark:
+                logging.info(f"{AGGREGATE_NAME} already covers every fact")
+                return 0
+
+            result = conn.execute(FOLD_INTO_AGGREGATE, {"watermark": watermark, "new_watermark": new_watermark})
+            touched = affected_rows(conn, result)
+
+            conn.execute(SAVE_AGGREGATE_WATERMARK, {"name": AGGREGATE_NAME, "last_fact_key": new_watermark})
+
+        logging.info(f"Folded facts {watermark + 1}..{new_watermark} into {AGGREGATE_NAME} "
+                     f"({touched} groups touched)")
+        return touched
+
+    except Exception as e:
+        logging.error(f"Failed to refresh {AGGREGATE_NAME}: {e}")
+        raise e
+
+
+DIMENSION_LOADERS = {
+    'dim_delivery_person': populate_dim_delivery_person,
+    'dim_location': populate_dim_location,
+    'dim_datetime': populate_dim_datetime,
+    'dim_vehicle': populate_dim_vehicle
+}
+DIMENSION_WORKERS = int(os.getenv("ETL_DIMENSION_WORKERS", str(len(DIMENSION_LOADERS))))
+
+
+def _timed_load(name, loader, df, conn, timings):
+    start = time.perf_counter()
+    loader(df, conn)
+    timings[name] = time.perf_counter() - start
+    logging.info(f"{name} loaded in {timings[name]:.2f}s")
+
+
+def _timed_prepare(name, df, timings):
+    start = time.perf_counter()
+    with track(f"prepare_{name}", rows_in=len(df)) as record:
+        frame = prepare_dimension(name, df)
+        record["rows_out"] = len(frame)
+    timings[name] = time.perf_counter() - start
+    return frame
+
+
+def populate_dimensions(df, engine, workers=DIMENSION_WORKERS):
+    timings = {}
+
+    if workers <= 1:
+        # one transaction for all dimensions
+        try:
+            with engine.begin() as conn:
+                for name, loader in DIMENSION_LOADERS.items():
+                    _timed_load(name, loader, df, conn, timings)
+            return timings
+        except Exception as e:
+            logging.error(f"Dimension load failed, all dimensions rolled back: {e}")
+            raise e
+
+    # the frames are built in parallel and written through one connection in one
+    # transaction, so a failed build, write or commit leaves every dimension as it was
+    try:
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="dim_builder") as pool:
+            # each worker runs in a copy of this context so its metrics nest under the caller's stage
+            futures = {name: pool.submit(contextvars.copy_context().run, _timed_prepare, name, df, timings)
+                       for name in DIMENSION_BUILDERS}
+            frames = {name: future.result() for name, future in futures.items()}
+
+        with engine.begin() as conn:
+            for name, frame in frames.items():
+                start = time.perf_counter()
+                with track(f"populate_{name}", rows_in=len(df)) as record:
+                    record["rows_out"] = write_dimension(name, frame, conn)
+                timings[name] += time.perf_counter() - start
+                logging.info(f"{name}: {record['rows_out']} records upserted, loaded in {timings[name]:.2f}s")
+        return timings
+
+    except Exception as e:
+        logging.error(f"Dimension load failed, all dimensions rolled back: {e}")
+        raise e
@@ -0,0 +1,180 @@
+import os
+import json
+import time
+import logging
+import threading
+import functools
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime, timezone
+import pandas as pd
+from dotenv import load_dotenv
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from profiling import profile_stage
+
+try:
+    import resource
+except ImportError:
+    # not available on Windows, peak RSS is then left out
+    resource = None
+
+load_dotenv()
+logging.basicConfig(level=logging.INFO , format="%(asctime)s - %(levelname)s - %(message)s")
+
+# <stage>.json and <stage>.prom are written here at the end of a run
+METRICS_DIR = os.getenv("ETL_METRICS_DIR", "logs/metrics")
+METRIC_PREFIX = "etl_stage"
+
+# stages currently open in this thread (or in the context it was started from)
+_active_stages = ContextVar("active_stages", default=())
+_records = []
+_lock = threading.Lock()
+
+
+def _peak_rss_bytes():
+    if resource is None:
+        return None
+    # ru_maxrss is in kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def record_round_trips(count=1):
+    # every open stage sees the statement, so a stage includes its nested ones
+    stages = _active_stages.get()
+    if not stages:
+        return
+    with _lock:
+        for record in stages:
+            record["round_trips"] += count
+
+
+def record_pool_checkout(wait_seconds):
+    # connections taken from the pool, and how long the stage waited for them
+    stages = _active_stages.get()
+    if not stages:
+        return
+    with _lock:
+        for record in stages:
+            record["pool_checkouts"] += 1
+            record["pool_wait_seconds"] += wait_seconds
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _count_statement(conn, cursor, statement, parameters, context, executemany):
+    record_round_trips()
+
+
+def _row_count(value):
+    if isinstance(value, (pd.DataFrame, pd.Series)):
+        return len(value)
+    if isinstance(value, tuple) and value and isinstance(value[0], pd.DataFrame):
+        return len(value[0])
+    if isinstance(value, int) and not isinstance(value, bool):
+        return value
+    return None
+
+
+@contextmanager
+def track(stage, rows_in=None):
+    record = {
+        "stage": stage,
+        "started_at": datetime.now(timezone.utc).isoformat(),
+        "duration_seconds": None,
+        "rows_in": rows_in,
+        "rows_out": None,
+        "rows_per_second": None,
+        "peak_rss_bytes": None,
+        "round_trips": 0,
+        "pool_checkouts": 0,
+        "pool_wait_seconds": 0.0,
+        "status": "running"
+    }
+    token = _active_stages.set(_active_stages.get() + (record,))
+    start = time.perf_counter()
+    try:
+        with profile_stage(stage):
+            yield record
+        record["status"] = "ok"
+    except BaseException:
+        record["status"] = "failed"
+        raise
+    finally:
+        _active_stages.reset(token)
+        record["duration_seconds"] = round(time.perf_counter() - start, 6)
+        rows = record["rows_in"] if record["rows_in"] is not None else record["rows_out"]
+        if rows is not None and record["duration_seconds"]:
+            record["rows_per_second"] = round(rows / record["duration_seconds"], 1)
+        record["peak_rss_bytes"] = _peak_rss_bytes()
+        record["pool_wait_seconds"] = round(record["pool_wait_seconds"], 6)
+        with _lock:
+            _records.append(record)
+        logging.info(f"[metrics] {stage}: {record['duration_seconds']:.2f}s, rows {record['rows_in']} -> "
+                     f"{record['rows_out']}, {record['round_trips']} round trips, "
+                     f"{record['pool_checkouts']} pool checkouts ({record['pool_wait_seconds']:.3f}s waiting)")
+
+
+def tracked(stage=None):
+    # rows in is the first DataFrame argument, rows out the returned frame or count
+    def decorator(func):
+        name = stage or func.__name__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            frames = [arg for arg in args if isinstance(arg, pd.DataFrame)]
+            with track(name, rows_in=len(frames[0]) if frames else None) as record:
+                result = func(*args, **kwargs)
+                record["rows_out"] = _row_count(result)
+                return result
+
+        return wrapper
+    return decorator
+
+
+def collect():
+    with _lock:
+        return [dict(record) for record in _records]
+
+
+def reset():
+    with _lock:
+        _records.clear()
+
+
+def to_prometheus(records):
+    gauges = {
+        "duration_seconds": "Wall time of the stage",
+        "rows_in": "Rows handed to the stage",
+        "rows_out": "Rows produced or written by the stage",
+        "peak_rss_bytes": "Process peak resident set size when the stage finished",
+        "round_trips": "SQL statements and COPY batches sent by the stage",
+        "pool_checkouts": "Connections the stage took from the pool",
+        "pool_wait_seconds": "Time the stage waited for pooled connections"
+    }
+    lines = []
+    for field, help_text in gauges.items():
+        metric = f"{METRIC_PREFIX}_{field}"
+        lines.append(f"# HELP {metric} {help_text}")
+        lines.append(f"# TYPE {metric} gauge")
+        for record in records:
+            if record[field] is not None:
+                lines.append(f'{metric}{{stage="{record["stage"]}",status="{record["status"]}"}} {record[field]}')
+    return "\n".join(lines) + "\n"
+
+
+def write_metrics(name="etl", records=None, metrics_dir=METRICS_DIR):
+    records = collect() if records is None else records
+    try:
+        os.makedirs(metrics_dir, exist_ok=True)
+        json_path = os.path.join(metrics_dir, f"{name}.json")
+        with open(json_path, "w") as output:
+            json.dump(records, output, indent=2)
+        with open(os.path.join(metrics_dir, f"{name}.prom"), "w") as output:
+            output.write(to_prometheus(records))
+        logging.info(f"Metrics for {len(records)} stages written to {json_path}")
+        return json_path
+
+    except Exception as e:
+        # metrics must never fail the pipeline
+        logging.error(f"Failed to write metrics: {e}")
+        return None
@@ -0,0 +1,48 @@
+import os
+import logging
+import pandas as pd
+from dotenv import load_dotenv
+from extract import order_months
+
+load_dotenv()
+logging.basicConfig(level=logging.INFO , format="%(asctime)s - %(levelname)s - %(message)s")
+
+# the DAG maps transform+load over these keys: the order month (how the raw
+# zone, staging and fact_deliveries are laid out) and optionally the city
+PARTITION_BY = [key.strip() for key in os.getenv("ETL_PARTITION_BY", "month,city").split(",") if key.strip()]
+# mapped partition tasks allowed to run at the same time
+PARTITION_CONCURRENCY = int(os.getenv("ETL_PARTITION_CONCURRENCY", "4"))
+PARTITION_COLUMNS = ["Order_Date", "City"]
+
+
+def partition_months(df):
+    return order_months(df["Order_Date"])
+
+
+def partition_labels(df):
+    labels = {"month": partition_months(df)}
+    if "city" in PARTITION_BY:
+        # raw values, so a partition selects the same rows before and after cleaning;
+        # missing cities form a partition of their own
+        labels["city"] = df["City"].astype(object).where(df["City"].notna(), None)
+    return pd.DataFrame(labels, index=df.index)
+
+
+def discover_partitions(batches):
+    # one dict per partition, JSON-safe so it can be handed to mapped tasks as op_kwargs
+    seen = set()
+    for batch in batches:
+        seen.update(partition_labels(batch).drop_duplicates().itertuples(index=False, name=None))
+    keys = ["month", "city"] if "city" in PARTITION_BY else ["month"]
+    partitions = [dict(zip(keys, values))
+                  for values in sorted(seen, key=lambda values: tuple(str(value) for value in values))]
+    logging.info(f"Discovered {len(partitions)} partitions by {', '.join(keys)}")
+    return partitions
+
+
+def select_partition(df, month, city=None):
+    labels = partition_labels(df)
+    mask = labels["month"] == month
+    if "city" in labels:
+        mask &= labels["city"].isna() if city is None else labels["city"] == city
+    return df[mask.to_numpy()]
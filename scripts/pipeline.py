@@ -0,0 +1,109 @@
+import os
+import queue
+import logging
+import threading
+import contextvars
+from dotenv import load_dotenv
+from metrics import track
+
+load_dotenv()
+logging.basicConfig(level=logging.INFO , format="%(asctime)s - %(levelname)s - %(message)s")
+
+# run extract, transform and load as concurrent stages handing batches on
+PIPELINED = os.getenv("ETL_PIPELINED", "false").lower() == "true"
+# batches waiting between two stages; a full queue blocks the stage feeding it
+PIPELINE_DEPTH = int(os.getenv("ETL_PIPELINE_DEPTH", "2"))
+POLL_SECONDS = 0.1
+
+# end of stream marker, passed on by every stage once its input is exhausted
+_DONE = object()
+
+
+def _put(channel, item, failed):
+    # waits while the next stage is busy, gives up once any stage has failed
+    while not failed.is_set():
+        try:
+            channel.put(item, timeout=POLL_SECONDS)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+
+def _get(channel, failed):
+    while not failed.is_set():
+        try:
+            return channel.get(timeout=POLL_SECONDS)
+        except queue.Empty:
+            continue
+    return _DONE
+
+
+def _produce(name, source, output, failed, errors):
+    try:
+        with track(name) as record:
+            record["rows_out"] = 0
+            for batch in source:
+                record["rows_out"] += len(batch)
+                if not _put(output, batch, failed):
+                    return
+    except Exception as e:
+        errors.append((name, e))
+        failed.set()
+    finally:
+        _put(output, _DONE, failed)
+
+
+def _consume(name, func, inbox, output, failed, errors):
+    # rows in and out are summed over every batch the stage handled
+    try:
+        with track(name) as record:
+            record["rows_in"] = record["rows_out"] = 0
+            while True:
+                batch = _get(inbox, failed)
+                if batch is _DONE:
+                    return
+                record["rows_in"] += len(batch)
+                result = func(batch)
+                if result is None:
+                    continue
+                record["rows_out"] += len(result)
+                if output is not None and not _put(output, result, failed):
+                    return
+    except Exception as e:
+        errors.append((name, e))
+        failed.set()
+    finally:
+        if output is not None:
+            _put(output, _DONE, failed)
+
+
+def run_pipeline(source, stages, depth=PIPELINE_DEPTH, name="pipeline"):
+    # source yields batches; each stage is (name, func) and runs in its own
+    # thread, func returns the batch for the next stage or None to drop it
+    failed = threading.Event()
+    errors = []
+    channels = [queue.Queue(maxsize=depth) for _ in stages]
+    threads = [threading.Thread(target=contextvars.copy_context().run,
+                                args=(_produce, f"{name}_source", source, channels[0], failed, errors),
+                                name=f"{name}_source")]
+    for position, (stage, func) in enumerate(stages):
+        output = channels[position + 1] if position + 1 < len(stages) else None
+        # every thread gets its own copy of the caller's context, so metrics nest under its stage
+        threads.append(threading.Thread(target=contextvars.copy_context().run,
+                                        args=(_consume, f"{name}_{stage}", func, channels[position],
+                                              output, failed, errors),
+                                        name=f"{name}_{stage}"))
+
+    logging.info(f"Starting {name}: source -> {' -> '.join(stage for stage, _ in stages)}, "
+                 f"up to {depth} batches queued per stage")
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    if errors:
+        stage, error = errors[0]
+        logging.error(f"{name} stopped, stage {stage} failed: {error}")
+        raise error
+    logging.info(f"{name} completed")
@@ -0,0 +1,124 @@
+import os
+import sys
+import pstats
+import cProfile
+import logging
+import threading
+import tracemalloc
+from collections import Counter
+from contextlib import contextmanager, nullcontext
+from datetime import datetime
+from dotenv import load_dotenv
+
+load_dotenv()
+logging.basicConfig(level=logging.INFO , format="%(asctime)s - %(levelname)s - %(message)s")
+
+# comma separated stage names (as recorded by metrics.track), or "all"
+PROFILE_STAGES = os.getenv("ETL_PROFILE_STAGES", "")
+PROFILE_DIR = os.getenv("ETL_PROFILE_DIR", "logs/profiles")
+PROFILE_TOP_N = int(os.getenv("ETL_PROFILE_TOP_N", "25"))
+SAMPLE_INTERVAL = float(os.getenv("ETL_PROFILE_SAMPLE_INTERVAL", "0.005"))
+
+_enabled_stages = set()
+# cProfile and tracemalloc are process-wide, so one stage is profiled at a time
+_profiling = threading.Lock()
+
+
+def enable_profiling(stages):
+    if isinstance(stages, str):
+        stages = stages.split(",")
+    _enabled_stages.clear()
+    _enabled_stages.update(stage.strip() for stage in stages if stage.strip())
+    if _enabled_stages:
+        logging.info(f"Profiling enabled for: {', '.join(sorted(_enabled_stages))}")
+
+
+def profiling_enabled(stage):
+    return stage in _enabled_stages or "all" in _enabled_stages
+
+
+def _frame_name(frame):
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})"
+
+
+def _sample_stacks(thread_id, stacks, stop):
+    # collapsed stacks, root first, as consumed by flamegraph.pl and speedscope
+    while not stop.wait(SAMPLE_INTERVAL):
+        frame = sys._current_frames().get(thread_id)
+        names = []
+        while frame is not None:
+            names.append(_frame_name(frame))
+            frame = frame.f_back
+        if names:
+            stacks[";".join(reversed(names))] += 1
+
+
+def _write_reports(stage, profiler, stacks, snapshot, peak_bytes):
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    base = os.path.join(PROFILE_DIR, f"{stage}-{datetime.now():%Y%m%dT%H%M%S}")
+
+    profiler.dump_stats(f"{base}.prof")
+    with open(f"{base}.txt", "w") as output:
+        pstats.Stats(profiler, stream=output).sort_stats("cumulative").print_stats(PROFILE_TOP_N)
+
+    with open(f"{base}.collapsed", "w") as output:
+        for stack, count in stacks.most_common():
+            output.write(f"{stack} {count}\n")
+
+    with open(f"{base}-alloc.txt", "w") as output:
+        statistics = snapshot.statistics("lineno")
+        output.write(f"peak traced memory: {peak_bytes / 2**20:.1f} MiB\n")
+        output.write(f"top {PROFILE_TOP_N} allocation sites still alive at the end of {stage}:\n")
+        for stat in statistics[:PROFILE_TOP_N]:
+            output.write(f"{stat}\n")
+
+    logging.info(f"Profile of {stage} written to {base}.*")
+
+
+@contextmanager
+def _profile(stage):
+    if not _profiling.acquire(blocking=False):
+        logging.warning(f"Another stage is being profiled, {stage} runs unprofiled")
+        yield
+        return
+
+    try:
+        started_tracing = not tracemalloc.is_tracing()
+        if started_tracing:
+            tracemalloc.start()
+        tracemalloc.reset_peak()
+
+        stacks = Counter()
+        stop = threading.Event()
+        sampler = threading.Thread(target=_sample_stacks, args=(threading.get_ident(), stacks, stop),
+                                   name=f"profile_{stage}", daemon=True)
+        profiler = cProfile.Profile()
+        sampler.start()
+        profiler.enable()
+        try:
+            yield
+        finally:
+            profiler.disable()
+            stop.set()
+            sampler.join()
+            snapshot = tracemalloc.take_snapshot()
+            peak_bytes = tracemalloc.get_traced_memory()[1]
+            if started_tracing:
+                tracemalloc.stop()
+            try:
+                _write_reports(stage, profiler, stacks, snapshot, peak_bytes)
+            except Exception as e:
+                logging.error(f"Failed to write profile of {stage}: {e}")
+    finally:
+        _profiling.release()
+
+
+def profile_stage(stage):
+    # a plain nullcontext unless the stage was asked for
+    if not _enabled_stages or not profiling_enabled(stage):
+        return nullcontext()
+    return _profile(stage)
+
+
+enable_profiling(PROFILE_STAGES)
@@ -0,0 +1,188 @@
+import os
+import logging
+from datetime import datetime, timezone
+import numpy as np
+import pandas as pd
+from sqlalchemy import text
+from dotenv import load_dotenv
+from bulk import copy_dataframe
+
+load_dotenv()
+logging.basicConfig(level=logging.INFO , format="%(asctime)s - %(levelname)s - %(message)s")
+
+RAW_SCHEMA = "raw_data"
+QUARANTINE_TABLE = "deliveries_quarantine"
+# rejected rows are appended to raw_data.deliveries_quarantine with the rules they failed
+QUARANTINE = os.getenv("ETL_QUARANTINE", "true").lower() == "true"
+# quarantine columns after the source's own, all of which are kept as text
+QUARANTINE_COLUMNS = {"failure_mask": "BIGINT", "failed_rules": "TEXT", "quarantined_at": "TIMESTAMP",
+                      "order_date": "DATE", "source_sha256": "TEXT", "run_id": "TEXT"}
+# a pickup this long after the order still counts, across midnight too
+MAX_PICKUP_MINUTES = int(os.getenv("ETL_MAX_PICKUP_MINUTES", "60"))
+
+CRITICAL_FIELDS = ["ID", "Delivery_person_ID", "Restaurant_latitude", "Restaurant_longitude",
+                   "Delivery_location_latitude", "Delivery_location_longitude", "Order_Date",
+                   "Time_Orderd", "Time_Order_picked", "Type_of_order", "City", "Time_taken (min)"]
+COORDINATE_LIMITS = {"Restaurant_latitude": 90, "Restaurant_longitude": 180,
+                     "Delivery_location_latitude": 90, "Delivery_location_longitude": 180}
+# values as they are after cleaning normalized them
+WEATHER_CONDITIONS = ["Sunny", "Stormy", "Sandstorms", "Cloudy", "Fog", "Windy"]
+TRAFFIC_DENSITIES = ["Low", "Medium", "High", "Jam"]
+# the export's "NaN " marker as the text normalizers leave it; it means missing, not an unknown category
+MISSING_MARKERS = ["NaN ", "Nan", "nan"]
+VEHICLE_TYPES = ["motorcycle", "scooter", "electric_scooter", "bicycle"]
+
+# checked against the parsed frame; a rule's position is its bit in the failure mask
+RULES = (
+    [{"name": f"missing_{column}", "check": "not_null", "column": column} for column in CRITICAL_FIELDS]
+    + [{"name": "duplicate", "check": "unique"}]
+    + [{"name": f"invalid_{column}", "check": "range", "column": column, "min": -limit, "max": limit,
+        "exclude": 0} for column, limit in COORDINATE_LIMITS.items()]
+    + [{"name": "unknown_weather", "check": "allowed", "column": "Weather_conditions",
+        "values": WEATHER_CONDITIONS},
+       {"name": "unknown_traffic_density", "check": "allowed", "column": "Road_traffic_density",
+        "values": TRAFFIC_DENSITIES},
+       {"name": "unknown_vehicle_type", "check": "allowed", "column": "Type_of_vehicle",
+        "values": VEHICLE_TYPES},
+       {"name": "picked_before_ordered", "check": "ordered", "column": "Time_Orderd",
+        "later_column": "Time_Order_picked", "max_minutes": MAX_PICKUP_MINUTES}]
+)
+
+
+def _not_null(df, rule):
+    return df[rule["column"]].isna().to_numpy()
+
+
+def _unique(df, rule):
+    # identical rows share their other failures, so the copy kept is the first
+    return df.duplicated(keep="first").to_numpy()
+
+
+def _range(df, rule):
+    # missing values fail too, as the comparisons are false for NaN
+    values = df[rule["column"]].to_numpy(dtype=float)
+    return ~((values >= rule["min"]) & (values <= rule["max"]) & (values != rule["exclude"]))
+
+
+def _allowed(df, rule):
+    # missing values and markers are left to the not_null rules, which only check critical fields
+    values = df[rule["column"]]
+    return (values.notna() & ~values.isin(rule["values"]) & ~values.isin(MISSING_MARKERS)).to_numpy()
+
+
+def _minutes_of_day(values):
+    # once per distinct time, there are at most 1440 of them
+    codes, uniques = pd.factorize(values, use_na_sentinel=True)
+    minutes = np.array([value.hour * 60 + value.minute for value in uniques] + [np.nan], dtype=float)
+    return minutes[codes]
+
+
+def _ordered(df, rule):
+    # the later time may fall after midnight, the gap is taken modulo a day
+    gap = (_minutes_of_day(df[rule["later_column"]]) - _minutes_of_day(df[rule["column"]])) % 1440
+    return gap > rule["max_minutes"]
+
+
+CHECKS = {
+    "not_null": _not_null,
+    "unique": _unique,
+    "range": _range,
+    "allowed": _allowed,
+    "ordered": _ordered
+}
+
+
+def evaluate_rules(df, rules=RULES):
+    # one boolean pass per rule, folded into a per-row bitmask; 0 means the row passed
+    if len(rules) > 64:
+        raise ValueError(f"{len(rules)} rules do not fit a 64-bit failure mask")
+    failures = np.zeros(len(df), dtype=np.uint64)
+    counts = {}
+    for bit, rule in enumerate(rules):
+        failed = CHECKS[rule["check"]](df, rule)
+        counts[rule["name"]] = int(failed.sum())
+        failures |= failed.astype(np.uint64) << np.uint64(bit)
+    return failures, counts
+
+
+def failure_reasons(failures, rules=RULES):
+    # rule names per row, built once per distinct mask
+    codes, masks = pd.factorize(failures)
+    reasons = np.array([",".join(rule["name"] for bit, rule in enumerate(rules) if int(mask) >> bit & 1)
+                        for mask in masks], dtype=object)
+    return reasons[codes]
+
+
+def build_quarantine(raw_df, failures, order_dates, rules=RULES):
+    # the rejected rows as they arrived, as text, with the mask and the rules they failed;
+    # the parsed order date lets a backfill replace only its range's rejects
+    if not QUARANTINE:
+        return None
+    rejected = failures != 0
+    quarantined = raw_df[rejected].astype("string")
+    return quarantined.assign(
+        failure_mask=failures[rejected].astype(np.int64),
+        failed_rules=failure_reasons(failures[rejected], rules),
+        quarantined_at=pd.Timestamp.now(tz="UTC").tz_localize(None),
+        order_date=order_dates[rejected].dt.normalize()
+    )
+
+
+# source and run stamped on every row this process quarantines
+_quarantine_run = {"source_sha256": None, "run_id": None}
+
+
+def create_quarantine_table(engine, source_columns):
+    # created once before a run cleans anything, never by the concurrent writers
+    columns = [f'"{column}" TEXT' for column in source_columns]
+    columns += [f"{name} {sql_type}" for name, sql_type in QUARANTINE_COLUMNS.items()]
+    with engine.begin() as conn:
+        conn.execute(text(f"CREATE SCHEMA IF NOT EXISTS {RAW_SCHEMA};"))
+        conn.execute(text(f"CREATE TABLE IF NOT EXISTS {RAW_SCHEMA}.{QUARANTINE_TABLE} ({', '.join(columns)})"))
+        # tables created before the run columns existed get them now
+        for name, sql_type in QUARANTINE_COLUMNS.items():
+            conn.execute(text(f"ALTER TABLE {RAW_SCHEMA}.{QUARANTINE_TABLE} ADD COLUMN IF NOT EXISTS {name} {sql_type}"))
+
+
+def join_quarantine(fingerprint, run_id):
+    # processes cleaning for a run someone else started only stamp their rows
+    _quarantine_run.update(source_sha256=(fingerprint or {}).get("source_sha256"), run_id=run_id)
+
+
+def start_quarantine(engine, source_columns, fingerprint, run_id=None, start=None, end=None):
+    # a run replaces the rejects earlier runs quarantined from the same source,
+    # a backfill (start and end) only those ordered in its range
+    run_id = run_id or datetime.now(timezone.utc).strftime("etl__%Y-%m-%dT%H:%M:%S")
+    join_quarantine(fingerprint, run_id)
+    if not QUARANTINE:
+        return 0
+    try:
+        create_quarantine_table(engine, source_columns)
+        condition, params = "source_sha256 = :sha", {"sha": _quarantine_run["source_sha256"]}
+        if start is not None:
+            condition += " AND order_date BETWEEN :start AND :end"
+            params.update(start=start.date(), end=end.date())
+        with engine.begin() as conn:
+            removed = conn.execute(text(f"DELETE FROM {RAW_SCHEMA}.{QUARANTINE_TABLE} WHERE {condition}"),
+                                   params).rowcount
+        logging.info(f"Quarantine run {run_id}: {removed} rows from earlier runs of this source replaced")
+        return removed
+
+    except Exception as e:
+        logging.error(f"Failed to prepare the quarantine table: {e}")
+        raise e
+
+
+def write_quarantine(quarantined, engine):
+    # appends to the table start_quarantine created for this run
+    if quarantined is None or quarantined.empty:
+        return 0
+    try:
+        quarantined = quarantined.assign(**_quarantine_run)
+        written = copy_dataframe(quarantined, engine, QUARANTINE_TABLE, RAW_SCHEMA)
+        logging.info(f"{written} rejected rows quarantined in {RAW_SCHEMA}.{QUARANTINE_TABLE}")
+        return written
+
+    except Exception as e:
+        logging.error(f"Failed to write quarantined rows: {e}")
+        raise e
@@ -0,0 +1,106 @@
+import os
+import re
+import json
+import shutil
+import logging
+import pandas as pd
+from dotenv import load_dotenv
+
+load_dotenv()
+logging.basicConfig(level=logging.INFO , format="%(asctime)s - %(levelname)s - %(message)s")
+
+# per-run Parquet artifacts handed from one DAG task to the next
+STAGING_DIR = os.getenv("ETL_STAGING_DIR", "data/staging")
+MARKER_FILE = "_SUCCESS"
+
+
+def stage_path(run_id, stage):
+    safe_run_id = re.sub(r"[^A-Za-z0-9_.-]", "_", run_id)
+    return os.path.join(STAGING_DIR, safe_run_id, stage)
+
+
+def stage_exists(run_id, stage):
+    return os.path.exists(os.path.join(stage_path(run_id, stage), MARKER_FILE))
+
+
+def save_stage(data, run_id, stage, partition_by=None):
+    # a frame or an iterable of frames, one Parquet part file each; with
+    # partition_by (frame -> labels) every label gets its own part files
+    path = stage_path(run_id, stage)
+    tmp_path = f"{path}.tmp"
+    try:
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        os.makedirs(tmp_path)
+
+        batches = [data] if isinstance(data, pd.DataFrame) else data
+        rows = 0
+        parts = 0
+        attrs = {}
+        partitions = {}
+        for batch in batches:
+            if partition_by is None:
+                pieces = [(None, batch)]
+            else:
+                pieces = batch.groupby(partition_by(batch), sort=True)
+            for label, piece in pieces:
+                piece.to_parquet(os.path.join(tmp_path, f"part-{parts:05d}.parquet"), index=False)
+                if label is not None:
+                    partitions.setdefault(label, []).append(parts)
+                parts += 1
+            rows += len(batch)
+            attrs = dict(batch.attrs)
+
+        # the marker is written last, so a stage without it was never finished
+        with open(os.path.join(tmp_path, MARKER_FILE), "w") as marker:
+            json.dump({"rows": rows, "parts": parts, "attrs": attrs, "partitions": partitions},
+                      marker, default=str)
+
+        shutil.rmtree(path, ignore_errors=True)
+        os.replace(tmp_path, path)
+        logging.info(f"Staged {rows} records for '{stage}' at {path}")
+        return path
+
+    except Exception as e:
+        logging.error(f"Failed to stage '{stage}' for run {run_id}: {e}")
+        raise e
+
+
+def _read_marker(path):
+    with open(os.path.join(path, MARKER_FILE)) as marker:
+        return json.load(marker)
+
+
+def stage_partitions(run_id, stage):
+    return sorted(_read_marker(stage_path(run_id, stage)).get("partitions", {}))
+
+
+def iter_stage(run_id, stage, partitions=None, columns=None):
+    path = stage_path(run_id, stage)
+    marker = _read_marker(path)
+    if partitions is None:
+        parts = range(marker["parts"])
+    else:
+        parts = sorted(part for label in partitions for part in marker["partitions"].get(label, []))
+    for part in parts:
+        yield pd.read_parquet(os.path.join(path, f"part-{part:05d}.parquet"), columns=columns)
+
+
+def read_stage(run_id, stage, partitions=None):
+    try:
+        path = stage_path(run_id, stage)
+        marker = _read_marker(path)
+        batches = list(iter_stage(run_id, stage, partitions))
+        df = pd.concat(batches, ignore_index=True) if batches else pd.DataFrame()
+        df.attrs.update(marker["attrs"])
+        logging.info(f"Read {len(df)} staged records for '{stage}' from {path}")
+        return df
+
+    except Exception as e:
+        logging.error(f"Failed to read stage '{stage}' for run {run_id}: {e}")
+        raise e
+
+
+def clear_stages(run_id):
+    path = os.path.dirname(stage_path(run_id, "_"))
+    shutil.rmtree(path, ignore_errors=True)
+    logging.info(f"Staged artifacts removed from {path}")
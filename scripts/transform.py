@@ -2,70 +2,232 @@ import os
 import pandas as pd 
 import numpy as np
 import logging
+import multiprocessing
+from datetime import time
+from concurrent.futures import ProcessPoolExecutor
 from sqlalchemy import create_engine , text
 from dotenv import load_dotenv
+from bulk import transaction_scope
+from metrics import tracked
+from quality import evaluate_rules, build_quarantine, write_quarantine
+from keys import KEY_MODE, migrate_to_hash_keys, check_key_mode
 
 load_dotenv()
 logging.basicConfig(level=logging.INFO , format="%(asctime)s - %(levelname)s - %(message)s")
 
-def cleaning(df):
-    logging.info("Starting data cleaning process...")
+# values treated as missing in the text columns
+MISSING_SENTINELS = ["", " ", "N/A", "n/a", "nan", "None", "none"]
+
+# explicit formats tried before falling back to per-element parsing
+ORDER_DATE_FORMATS = ["%d-%m-%Y"]
+# source times, then times a TIME column handed back as text (SQLite)
+TIME_FORMATS = ["%H:%M", "%H:%M:%S", "%H:%M:%S.%f"]
+
+FLOAT_COLUMNS = ["Restaurant_latitude", "Restaurant_longitude", "Delivery_location_latitude",
+                 "Delivery_location_longitude", "Time_taken (min)"]
+ZERO_FILLED_COLUMNS = {"Delivery_person_Age": int, "Delivery_person_Ratings": float,
+                       "multiple_deliveries": int, "Vehicle_condition": int}
+TITLE_COLUMNS = ["Weather_conditions", "Road_traffic_density", "Type_of_order", "Festival", "City"]
+
+# sharded multi-process cleaning; 1 worker keeps everything in this process
+TRANSFORM_WORKERS = int(os.getenv("ETL_TRANSFORM_WORKERS", "1"))
+TRANSFORM_SHARD_ROWS = int(os.getenv("ETL_TRANSFORM_SHARD_ROWS", "250000"))
+
+
+def _parse_distinct(values, parse, missing):
+    # parse every distinct value once and scatter the results back; the
+    # parsers are element-wise, so this matches parsing the whole column
+    codes, uniques = pd.factorize(values, use_na_sentinel=True)
+    parsed = parse(pd.Series(uniques, dtype=object)).to_numpy()
+    parsed = np.append(parsed, np.array([missing], dtype=parsed.dtype))
+    return pd.Series(parsed[codes], index=values.index)
+
+
+def _order_dates(values):
+    parsed = pd.to_datetime(values, format=ORDER_DATE_FORMATS[0], errors="coerce")
+    for date_format in ORDER_DATE_FORMATS[1:] + ["mixed"]:
+        failed = parsed.isna() & values.notna()
+        if not failed.any():
+            break
+        # only the values the previous formats could not read
+        parsed[failed] = pd.to_datetime(values[failed], format=date_format, errors="coerce", dayfirst=True)
+    return parsed
+
+
+def parse_order_dates(values):
+    if pd.api.types.is_datetime64_any_dtype(values):
+        return values.astype("datetime64[ns]")
+    return _parse_distinct(values, _order_dates, np.datetime64("NaT")).astype("datetime64[ns]")
+
+
+def _times(values):
+    # the typed CSV reader and TIME columns already hand over datetime.time values
+    is_time = values.map(lambda value: isinstance(value, time))
+    text_values = values.mask(is_time)
+    parsed = pd.to_datetime(text_values, format=TIME_FORMATS[0], errors="coerce")
+    for time_format in TIME_FORMATS[1:]:
+        failed = parsed.isna() & text_values.notna()
+        if not failed.any():
+            break
+        parsed[failed] = pd.to_datetime(text_values[failed], format=time_format, errors="coerce")
+    return parsed.dt.time.astype(object).mask(is_time, values)
+
+
+def parse_times(values):
+    return _parse_distinct(values, _times, pd.NaT)
+
+
+def _numbers(values):
+    return pd.to_numeric(values, errors='coerce').astype(float)
+
+
+def _missing_to_na(values):
+    return values.mask(values.isna() | values.isin(MISSING_SENTINELS), pd.NA)
+
+
+def parse_text(values, normalize):
+    return _parse_distinct(values, lambda v: _missing_to_na(normalize(v)).astype(object), pd.NA)
+
+
+def _title(values):
+    return values.str.strip().str.title()
+
+
+def _vehicle_type(values):
+    return values.str.strip().str.lower().str.replace(" ", "_")
+
+
+def parse_columns(df):
+    # typed copy of the raw frame; the caller's frame is left untouched
+    parsed = {}
+    parsed["Order_Date"] = parse_order_dates(df["Order_Date"])
+    parsed["Time_Orderd"] = parse_times(df["Time_Orderd"])
+    parsed["Time_Order_picked"] = parse_times(df["Time_Order_picked"])
     
-    df["Order_Date"] = pd.to_datetime(df["Order_Date"], format="mixed", errors="coerce", dayfirst=True)
-    df["Time_Orderd"] = pd.to_datetime(df["Time_Orderd"], format="%H:%M", errors="coerce").dt.time
-    df["Time_Order_picked"] = pd.to_datetime(df["Time_Order_picked"], format="%H:%M", errors="coerce").dt.time
+    for column in FLOAT_COLUMNS:
+        parsed[column] = _numbers(df[column])
+    for column, dtype in ZERO_FILLED_COLUMNS.items():
+        parsed[column] = _parse_distinct(df[column], _numbers, np.nan).fillna(0).astype(dtype)
     
-    df["Delivery_person_Age"] = pd.to_numeric(df["Delivery_person_Age"], errors='coerce').fillna(0).astype(int)
-    df["Delivery_person_Ratings"] = pd.to_numeric(df["Delivery_person_Ratings"], errors='coerce').fillna(0).astype(float)
-    df["Restaurant_latitude"] = pd.to_numeric(df["Restaurant_latitude"], errors='coerce')
-    df["Restaurant_longitude"] = pd.to_numeric(df["Restaurant_longitude"], errors='coerce')
-    df["Delivery_location_latitude"] = pd.to_numeric(df["Delivery_location_latitude"], errors='coerce')
-    df["Delivery_location_longitude"] = pd.to_numeric(df["Delivery_location_longitude"], errors='coerce')
-    df["Time_taken (min)"] = pd.to_numeric(df["Time_taken (min)"], errors='coerce')
+    for column in TITLE_COLUMNS:
+        parsed[column] = parse_text(df[column], _title)
+    parsed["Type_of_vehicle"] = parse_text(df["Type_of_vehicle"], _vehicle_type)
     
-    df["multiple_deliveries"] = pd.to_numeric(df["multiple_deliveries"], errors='coerce').fillna(0).astype(int)
+    # any other text column only gets its sentinels normalized
+    for column in df.columns:
+        if column not in parsed:
+            parsed[column] = _missing_to_na(df[column]) if df[column].dtype == object else df[column]
     
-    df["Weather_conditions"] = df["Weather_conditions"].str.strip().str.title()
-    df["Road_traffic_density"] = df["Road_traffic_density"].str.strip().str.title()
-    df["Vehicle_condition"] = pd.to_numeric(df["Vehicle_condition"], errors='coerce').fillna(0).astype(int)
-    df["Type_of_order"] = df["Type_of_order"].str.strip().str.title()
-    df["Type_of_vehicle"] = df["Type_of_vehicle"].str.strip().str.lower().str.replace(" ", "_")
-    df["Festival"] = df["Festival"].str.strip().str.title()
-    df["City"] = df["City"].str.strip().str.title()
+    return pd.DataFrame(parsed, index=df.index)[list(df.columns)]
+
+
+def clean_frame(df):
+    # every rule of quality.RULES in one pass; rows failing any of them are
+    # dropped and, with their reasons, handed back for the quarantine table
+    parsed = parse_columns(df)
+    failures, stats = evaluate_rules(parsed)
+    passed = failures == 0
+    stats["rejected"] = int((~passed).sum())
+    return parsed[passed], stats, build_quarantine(df, failures, parsed["Order_Date"])
+
+
+def _log_cleaning_stats(stats, final_rows):
+    for rule, count in stats.items():
+        if count and rule != "rejected":
+            logging.info(f"{count} rows failed {rule}")
+    logging.info(f"{stats['rejected']} rows rejected!")
+    logging.info(f"Data cleaning completed. Final record count: {final_rows}")
+
+
+@tracked()
+def cleaning(df, engine=None):
+    logging.info("Starting data cleaning process...")
     
-    critical_fields = ["ID", "Delivery_person_ID", "Restaurant_latitude", "Restaurant_longitude", 
-                      "Delivery_location_latitude", "Delivery_location_longitude", "Order_Date",
-                      "Time_Orderd", "Time_Order_picked", "Type_of_order", "City", "Time_taken (min)"]
+    df, stats, quarantined = clean_frame(df)
+    _log_cleaning_stats(stats, len(df))
+    if engine is not None:
+        write_quarantine(quarantined, engine)
+    return df
 
-    initial_rows_count = len(df)
-    df = df.replace(["", " ", "N/A", "n/a", "nan", "None", "none", None, np.nan], pd.NA)
-    df = df.dropna(subset=critical_fields)
-    dropped_rows_count = initial_rows_count - len(df)
-    logging.info(f"{dropped_rows_count} rows with critical missing fields dropped!")
+
+def shard_by_id(df, shards):
+    # identical rows share their ID, so every duplicate lands in the same shard
+    # and per-shard drop_duplicates equals the global one
+    assignment = (pd.util.hash_pandas_object(df["ID"], index=False).to_numpy() % shards).astype(np.int64)
+    order = np.argsort(assignment, kind="stable")
+    bounds = np.cumsum(np.bincount(assignment, minlength=shards))[:-1]
+    return np.split(order, bounds)
+
+
+# frame being sharded; forked workers inherit it and only receive row positions
+_shard_source = None
+
+
+def _clean_shard(shard):
+    if isinstance(shard, pd.DataFrame):
+        return clean_frame(shard)
+    return clean_frame(_shard_source.iloc[shard])
+
+
+def parallel_cleaning(df, workers=TRANSFORM_WORKERS, shard_rows=TRANSFORM_SHARD_ROWS, engine=None):
+    global _shard_source
+    shards = max(workers, -(-len(df) // shard_rows))
+    if workers <= 1 or len(df) <= shard_rows:
+        return cleaning(df, engine)
     
-    initial_rows_count = len(df)
-    df = df.drop_duplicates(keep='first')
-    duplicate_count = initial_rows_count - len(df)
-    logging.info(f"{duplicate_count} duplicate rows dropped!")
+    logging.info(f"Starting data cleaning process on {shards} shards with {workers} workers...")
+    try:
+        # positional index while sharding, so the merge restores the input order
+        original_index = df.index
+        df = df.set_axis(pd.RangeIndex(len(df)))
+        positions = shard_by_id(df, shards)
+        
+        if "fork" in multiprocessing.get_all_start_methods():
+            context = multiprocessing.get_context("fork")
+            _shard_source = df
+            tasks = positions
+        else:
+            context = None
+            tasks = [df.iloc[shard] for shard in positions]
+        
+        with ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool:
+            results = list(pool.map(_clean_shard, tasks))
+        
+        cleaned = pd.concat([shard for shard, _, _ in results]).sort_index()
+        cleaned.index = original_index[cleaned.index]
+        stats = {key: sum(shard_stats[key] for _, shard_stats, _ in results) for key in results[0][1]}
+        
+        _log_cleaning_stats(stats, len(cleaned))
+        quarantined = [shard for _, _, shard in results if shard is not None]
+        if engine is not None and quarantined:
+            write_quarantine(pd.concat(quarantined, ignore_index=True), engine)
+        return cleaned
     
-    # Coordinate validation
+    except Exception as e:
+        logging.error(f"Parallel cleaning failed: {e}")
+        raise e
+    finally:
+        _shard_source = None
+
+
+def clean_batches(batches, engine=None):
+    cleaned_batches = []
+    raw_records = 0
+    for batch in batches:
+        raw_records += len(batch)
+        cleaned_batches.append(cleaning(batch, engine))
+
+    if not cleaned_batches:
+        return pd.DataFrame(), raw_records
+
+    # duplicates that landed in different batches
+    df = pd.concat(cleaned_batches, ignore_index=True)
     initial_rows_count = len(df)
-    df = df[
-        (df['Restaurant_latitude'].between(-90, 90)) & 
-        (df['Restaurant_longitude'].between(-180, 180)) &
-        (df['Delivery_location_latitude'].between(-90, 90)) & 
-        (df['Delivery_location_longitude'].between(-180, 180)) &
-        (df['Restaurant_latitude'] != 0) & 
-        (df['Restaurant_longitude'] != 0) &
-        (df['Delivery_location_latitude'] != 0) & 
-        (df['Delivery_location_longitude'] != 0)
-    ]
-    invalid_coords_count = initial_rows_count - len(df)
-    logging.info(f"{invalid_coords_count} rows with invalid coordinates dropped!")
-    
-    logging.info(f"Data cleaning completed. Final record count: {len(df)}")
-    return df
-    
+    df = df.drop_duplicates(keep='first')
+    logging.info(f"{initial_rows_count - len(df)} duplicate rows across batches dropped!")
+    logging.info(f"Batch cleaning completed. Final record count: {len(df)}")
+    return df, raw_records
+
 
 def create_star_schema(engine):
     try:
@@ -90,6 +252,7 @@ def create_star_schema_tables(engine):
         'dim_location':""" 
             CREATE TABLE IF NOT EXISTS star_schema.dim_location(
                 location_key SERIAL PRIMARY KEY,
+                geo_cell VARCHAR(12),
                 latitude DECIMAL(10,8),
                 longitude DECIMAL(10,8),
                 city VARCHAR(50),
@@ -119,8 +282,9 @@ def create_star_schema_tables(engine):
         ,
         'fact_deliveries' :""" 
             CREATE TABLE IF NOT EXISTS star_schema.fact_deliveries(
-                fact_key SERIAL PRIMARY KEY,
-                delivery_id VARCHAR(50) UNIQUE NOT NULL,
+                fact_key SERIAL,
+                delivery_id VARCHAR(50) NOT NULL,
+                order_date DATE NOT NULL,
                 delivery_person_key INTEGER REFERENCES star_schema.dim_delivery_person(delivery_person_key),
                 restaurant_location_key INTEGER REFERENCES star_schema.dim_location(location_key),
                 delivery_location_key INTEGER REFERENCES star_schema.dim_location(location_key),
@@ -131,16 +295,297 @@ def create_star_schema_tables(engine):
                 road_traffic_density VARCHAR(50),
                 festival VARCHAR(5),
                 multiple_deliveries INTEGER,
-                time_taken INTEGER
+                time_taken INTEGER,
+                distance_km NUMERIC(8,3),
+                PRIMARY KEY (fact_key, order_date),
+                UNIQUE (delivery_id, order_date)
+            ) PARTITION BY RANGE (order_date);
+        """,
+        'agg_daily_delivery_stats' :""" 
+            CREATE TABLE IF NOT EXISTS star_schema.agg_daily_delivery_stats(
+                order_date DATE NOT NULL,
+                city VARCHAR(50) NOT NULL,
+                weather_condition VARCHAR(50) NOT NULL,
+                road_traffic_density VARCHAR(50) NOT NULL,
+                vehicle_type VARCHAR(50) NOT NULL,
+                deliveries BIGINT NOT NULL,
+                time_taken_count BIGINT NOT NULL,
+                time_taken_sum BIGINT,
+                time_taken_min INTEGER,
+                time_taken_max INTEGER,
+                PRIMARY KEY (order_date, city, weather_condition, road_traffic_density, vehicle_type)
+            );
+        """,
+        'agg_refresh_state' :""" 
+            CREATE TABLE IF NOT EXISTS star_schema.agg_refresh_state(
+                aggregate_name VARCHAR(50) PRIMARY KEY,
+                last_fact_key BIGINT NOT NULL,
+                refreshed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
             );
+        """,
+        'agg_daily_delivery_stats_v' :""" 
+            CREATE OR REPLACE VIEW star_schema.agg_daily_delivery_stats_v AS
+            SELECT *, time_taken_sum::NUMERIC / NULLIF(time_taken_count, 0) AS avg_time_taken
+            FROM star_schema.agg_daily_delivery_stats;
+        """,
+        'pipeline_state' :""" 
+            CREATE TABLE IF NOT EXISTS star_schema.pipeline_state(
+                pipeline_name VARCHAR(50) PRIMARY KEY,
+                source_sha256 VARCHAR(64),
+                source_size BIGINT,
+                source_mtime DOUBLE PRECISION,
+                last_order_date DATE,
+                rows_loaded INTEGER,
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            );
+        """
+    }
+    # columns added after the first release, for warehouses created before them
+    migrations = {
+        'dim_location.geo_cell' :""" 
+            ALTER TABLE star_schema.dim_location ADD COLUMN IF NOT EXISTS geo_cell VARCHAR(12);
+        """,
+        'dim_location_natural_key' :""" 
+            DROP INDEX IF EXISTS star_schema.dim_location_natural_key;
+        """,
+        'fact_deliveries.distance_km' :""" 
+            ALTER TABLE star_schema.fact_deliveries ADD COLUMN IF NOT EXISTS distance_km NUMERIC(8,3);
         """
     }
+    # natural keys targeted by the ON CONFLICT upserts in load.py; locations
+    # from before geo_cell keep a NULL cell and never conflict
+    indexes = {
+        'dim_location_geo_cell_key' :""" 
+            CREATE UNIQUE INDEX IF NOT EXISTS dim_location_geo_cell_key
+            ON star_schema.dim_location (geo_cell, city, location_type);
+        """,
+        'dim_vehicle_natural_key' :""" 
+            CREATE UNIQUE INDEX IF NOT EXISTS dim_vehicle_natural_key
+            ON star_schema.dim_vehicle (vehicle_condition, vehicle_type);
+        """
+    }
+    if engine.dialect.name == "duckdb":
+        key, reference = COLUMNAR_KEYS[KEY_MODE]
+        columnar = {table: query.format(key=key.format(sequence=f"{table}_key_seq"), reference=reference)
+                    for table, query in COLUMNAR_TABLES.items()}
+        _create_columnar_tables(engine, {**tables, **columnar})
+        return
     try:
-        with engine.connect() as conn:
+        with engine.begin() as conn:
+            legacy_facts = _rename_unpartitioned_fact_table(conn)
             for table , query in tables.items():
                 conn.execute(text(query))
                 logging.info(f"{table} Created/Checked")
+            for migration , query in migrations.items():
+                conn.execute(text(query))
+                logging.info(f"{migration} migrated/checked")
+            for index , query in {**indexes, **FACT_INDEXES}.items():
+                conn.execute(text(query))
+                logging.info(f"{index} Created/Checked")
+            if legacy_facts:
+                _migrate_legacy_facts(conn)
+            if KEY_MODE == "hash":
+                migrate_to_hash_keys(conn)
+            check_key_mode(conn)
             logging.info("tables created/checked") 
     except Exception as e:
         logging.error(f"failed to create tables")
-        raise e
\ No newline at end of file
+        raise e
+
+
+# the same star schema for a column-store target: sequences stand in for
+# SERIAL and natural keys are table constraints; there are no partitions,
+# foreign keys or foreign-key indexes, which columnar scans do not use.
+# Dimension keys and the fact columns holding them follow ETL_KEY_MODE
+COLUMNAR_KEYS = {
+    "serial": ("INTEGER PRIMARY KEY DEFAULT nextval('star_schema.{sequence}')", "INTEGER"),
+    "hash": ("BIGINT PRIMARY KEY", "BIGINT")
+}
+COLUMNAR_SEQUENCES = ["dim_delivery_person_key_seq", "dim_location_key_seq", "dim_datetime_key_seq",
+                      "dim_vehicle_key_seq", "fact_deliveries_key_seq"]
+COLUMNAR_TABLES = {
+    'dim_delivery_person':"""
+        CREATE TABLE IF NOT EXISTS star_schema.dim_delivery_person(
+            delivery_person_key {key},
+            delivery_person_id VARCHAR(50) UNIQUE NOT NULL,
+            age INTEGER,
+            ratings DECIMAL(2,1)
+        );
+    """,
+    'dim_location':"""
+        CREATE TABLE IF NOT EXISTS star_schema.dim_location(
+            location_key {key},
+            geo_cell VARCHAR(12),
+            latitude DECIMAL(10,8),
+            longitude DECIMAL(10,8),
+            city VARCHAR(50),
+            location_type VARCHAR(20) NOT NULL,
+            UNIQUE(geo_cell, city, location_type)
+        );
+    """,
+    'dim_datetime':"""
+        CREATE TABLE IF NOT EXISTS star_schema.dim_datetime(
+            datetime_key {key},
+            order_date DATE NOT NULL,
+            time_ordered TIME,
+            time_picked TIME,
+            day INTEGER,
+            month INTEGER,
+            year INTEGER,
+            UNIQUE(order_date, time_ordered, time_picked)
+        );
+    """,
+    'dim_vehicle':"""
+        CREATE TABLE IF NOT EXISTS star_schema.dim_vehicle(
+            vehicle_key {key},
+            vehicle_condition INTEGER,
+            vehicle_type VARCHAR(50),
+            UNIQUE(vehicle_condition, vehicle_type)
+        );
+    """,
+    'fact_deliveries':"""
+        CREATE TABLE IF NOT EXISTS star_schema.fact_deliveries(
+            fact_key INTEGER DEFAULT nextval('star_schema.fact_deliveries_key_seq'),
+            delivery_id VARCHAR(50) NOT NULL,
+            order_date DATE NOT NULL,
+            delivery_person_key {reference},
+            restaurant_location_key {reference},
+            delivery_location_key {reference},
+            vehicle_key {reference},
+            datetime_key {reference},
+            order_type VARCHAR(50),
+            weather_condition VARCHAR(50),
+            road_traffic_density VARCHAR(50),
+            festival VARCHAR(5),
+            multiple_deliveries INTEGER,
+            time_taken INTEGER,
+            distance_km NUMERIC(8,3),
+            PRIMARY KEY (fact_key, order_date),
+            UNIQUE (delivery_id, order_date)
+        );
+    """
+}
+
+
+def _create_columnar_tables(engine, tables):
+    try:
+        with engine.begin() as conn:
+            for sequence in COLUMNAR_SEQUENCES:
+                conn.execute(text(f"CREATE SEQUENCE IF NOT EXISTS star_schema.{sequence};"))
+            for table , query in tables.items():
+                conn.execute(text(query))
+                logging.info(f"{table} Created/Checked")
+            # a file built in the other key mode is rebuilt, not migrated
+            check_key_mode(conn)
+            logging.info("columnar tables created/checked")
+    except Exception as e:
+        logging.error(f"failed to create columnar tables")
+        raise e
+
+
+# foreign-key indexes on fact_deliveries; dropped during full reloads and
+# rebuilt once the bulk insert is done
+FACT_INDEXES = {
+    f'fact_deliveries_{column}_idx': f"""
+        CREATE INDEX IF NOT EXISTS fact_deliveries_{column}_idx
+        ON star_schema.fact_deliveries ({column});
+    """
+    for column in ['delivery_person_key', 'restaurant_location_key', 'delivery_location_key',
+                   'vehicle_key', 'datetime_key']
+}
+
+
+def drop_fact_indexes(engine):
+    if engine.dialect.name == "duckdb":
+        return
+    try:
+        with engine.begin() as conn:
+            for index in FACT_INDEXES:
+                conn.execute(text(f"DROP INDEX IF EXISTS star_schema.{index};"))
+        logging.info("fact_deliveries indexes dropped for bulk load")
+    except Exception as e:
+        logging.error(f"Failed to drop fact indexes: {e}")
+        raise e
+
+
+def create_fact_indexes(engine):
+    if engine.dialect.name == "duckdb":
+        return
+    try:
+        with engine.begin() as conn:
+            for index , query in FACT_INDEXES.items():
+                conn.execute(text(query))
+        logging.info("fact_deliveries indexes created")
+    except Exception as e:
+        logging.error(f"Failed to create fact indexes: {e}")
+        raise e
+
+
+def fact_partition_name(month):
+    return f"fact_deliveries_y{month.year}m{month.month:02d}"
+
+
+def ensure_fact_partitions(connectable, order_dates):
+    # one monthly range partition per month present in the batch
+    if connectable.dialect.name == "duckdb":
+        # the columnar fact table is not partitioned
+        return
+    months = pd.to_datetime(pd.Series(order_dates)).dropna().dt.to_period('M').unique()
+    try:
+        with transaction_scope(connectable) as conn:
+            for month in months:
+                conn.execute(text(f"""
+                    CREATE TABLE IF NOT EXISTS star_schema.{fact_partition_name(month)}
+                    PARTITION OF star_schema.fact_deliveries
+                    FOR VALUES FROM ('{month.start_time.date()}') TO ('{(month + 1).start_time.date()}');
+                """))
+        logging.info(f"{len(months)} fact_deliveries partitions checked/created")
+    except Exception as e:
+        logging.error(f"Failed to create fact partitions: {e}")
+        raise e
+
+
+def _rename_unpartitioned_fact_table(conn):
+    # fact_deliveries created before partitioning is moved aside and copied over
+    legacy = conn.execute(text("""
+        SELECT 1
+        FROM pg_class c
+        JOIN pg_namespace n ON n.oid = c.relnamespace
+        WHERE n.nspname = 'star_schema' AND c.relname = 'fact_deliveries' AND c.relkind = 'r'
+    """)).fetchone()
+    if legacy:
+        conn.execute(text("ALTER TABLE star_schema.fact_deliveries RENAME TO fact_deliveries_unpartitioned;"))
+        logging.info("Unpartitioned fact_deliveries renamed for migration")
+    return legacy is not None
+
+
+def _migrate_legacy_facts(conn):
+    order_dates = conn.execute(text("""
+        SELECT DISTINCT d.order_date
+        FROM star_schema.fact_deliveries_unpartitioned f
+        JOIN star_schema.dim_datetime d ON d.datetime_key = f.datetime_key
+    """)).scalars().all()
+    ensure_fact_partitions(conn, order_dates)
+
+    migrated = conn.execute(text("""
+        INSERT INTO star_schema.fact_deliveries
+            (fact_key, delivery_id, order_date, delivery_person_key, restaurant_location_key,
+             delivery_location_key, vehicle_key, datetime_key, order_type, weather_condition,
+             road_traffic_density, festival, multiple_deliveries, time_taken)
+        SELECT f.fact_key, f.delivery_id, d.order_date, f.delivery_person_key, f.restaurant_location_key,
+               f.delivery_location_key, f.vehicle_key, f.datetime_key, f.order_type, f.weather_condition,
+               f.road_traffic_density, f.festival, f.multiple_deliveries, f.time_taken
+        FROM star_schema.fact_deliveries_unpartitioned f
+        JOIN star_schema.dim_datetime d ON d.datetime_key = f.datetime_key
+    """)).rowcount
+    conn.execute(text("""
+        SELECT setval(pg_get_serial_sequence('star_schema.fact_deliveries', 'fact_key'),
+                      COALESCE((SELECT MAX(fact_key) FROM star_schema.fact_deliveries), 0) + 1, false)
+    """))
+
+    remaining = conn.execute(text("SELECT COUNT(*) FROM star_schema.fact_deliveries_unpartitioned")).scalar() - migrated
+    if remaining:
+        logging.warning(f"{remaining} facts without an order date left in star_schema.fact_deliveries_unpartitioned")
+    else:
+        conn.execute(text("DROP TABLE star_schema.fact_deliveries_unpartitioned;"))
+    logging.info(f"Migrated {migrated} facts into partitioned fact_deliveries")
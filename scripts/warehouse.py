@@ -0,0 +1,60 @@
+import os
+import shutil
+import logging
+from sqlalchemy import create_engine, text
+from dotenv import load_dotenv
+
+load_dotenv()
+logging.basicConfig(level=logging.INFO , format="%(asctime)s - %(levelname)s - %(message)s")
+
+# where star_schema is built: postgres (beside the raw data) or duckdb (a local
+# column-store file, so dashboard scans stay off the Airflow database)
+WAREHOUSE_TARGET = os.getenv("ETL_WAREHOUSE", "postgres").lower()
+WAREHOUSE_PATH = os.getenv("ETL_WAREHOUSE_PATH", "data/warehouse/food_delivery.duckdb")
+# Parquet copy of the star schema written after every duckdb load; empty disables it
+WAREHOUSE_EXPORT_DIR = os.getenv("ETL_WAREHOUSE_EXPORT_DIR", "data/warehouse/parquet")
+STAR_SCHEMA = "star_schema"
+EXPORT_TABLES = ["dim_delivery_person", "dim_location", "dim_datetime", "dim_vehicle",
+                 "agg_daily_delivery_stats"]
+
+
+def create_warehouse_conn(engine):
+    # the raw data always stays in Postgres; only the star schema moves
+    if WAREHOUSE_TARGET == "postgres":
+        return engine
+    if WAREHOUSE_TARGET == "duckdb":
+        os.makedirs(os.path.dirname(WAREHOUSE_PATH) or ".", exist_ok=True)
+        warehouse = create_engine(f"duckdb:///{WAREHOUSE_PATH}")
+        logging.info(f"Star schema target: DuckDB at {WAREHOUSE_PATH}")
+        return warehouse
+    raise ValueError(f"Unknown ETL_WAREHOUSE target '{WAREHOUSE_TARGET}', expected postgres or duckdb")
+
+
+def export_parquet(warehouse, export_dir=WAREHOUSE_EXPORT_DIR):
+    # one file per dimension and aggregate, facts split by order month
+    if warehouse.dialect.name != "duckdb" or not export_dir:
+        return None
+    tmp_dir = f"{export_dir}.tmp"
+    try:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        os.makedirs(tmp_dir)
+        with warehouse.connect() as conn:
+            for table in EXPORT_TABLES:
+                conn.execute(text(f"""
+                    COPY {STAR_SCHEMA}.{table} TO '{os.path.join(tmp_dir, table)}.parquet' (FORMAT parquet)
+                """))
+            conn.execute(text(f"""
+                COPY (SELECT *, strftime(order_date, '%Y-%m') AS order_month
+                      FROM {STAR_SCHEMA}.fact_deliveries)
+                TO '{os.path.join(tmp_dir, 'fact_deliveries')}' (FORMAT parquet, PARTITION_BY (order_month))
+            """))
+
+        shutil.rmtree(export_dir, ignore_errors=True)
+        os.replace(tmp_dir, export_dir)
+        logging.info(f"Star schema exported to Parquet under {export_dir}")
+        return export_dir
+
+    except Exception as e:
+        logging.error(f"Parquet export of the warehouse failed: {e}")
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        raise e